@@ -0,0 +1,32 @@
+import time
+
+import requests
+
+from metrics import API_REQUEST_DURATION
+from settings import get_secret
+
+CATASTROPHIA_API_URL = get_secret("CATASTROPHIA_API_URL")
+API_KEY_HEADERS = {
+    "api-key": get_secret("API_KEY")
+}
+
+
+def api_request(method: str,
+                endpoint: str,
+                params: dict | None = None,
+                timeout: float | None = 5) -> requests.Response:
+    """Sends a request to the Catastrophia API server and records
+    its duration and status. Request exceptions are raised to the
+    caller, they are recorded with the status 'error'."""
+
+    start = time.perf_counter()
+    status = "error"
+    try:
+        response = requests.request(method, CATASTROPHIA_API_URL + endpoint,
+                                    params=params, headers=API_KEY_HEADERS,
+                                    timeout=timeout)
+        status = str(response.status_code)
+        return response
+    finally:
+        duration = time.perf_counter() - start
+        API_REQUEST_DURATION.observe(duration, (endpoint, method, status))
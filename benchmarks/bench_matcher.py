@@ -0,0 +1,238 @@
+"""Benchmarks the moderation matcher against the offensive list and synthetic word
+lists.
+
+Usage:
+    python benchmarks/bench_matcher.py --messages 2000 --output matcher_results.json
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from offensive_matcher import CompiledMatcher, load_raw_list  # noqa: E402
+
+OFFENSIVE_LIST_PATH = os.path.join(REPO_DIR, "offensive_list.json")
+WORD_LIST_SIZES = [1000, 5000, 10000, 50000]
+
+# building blocks of the synthetic chat corpus
+CHAT_TEMPLATES = [
+    "anyone want to play {word} later?",
+    "gg that was a close one",
+    "how do i get the top 10 role",
+    "i have {number} hours in this game lol",
+    "the {word} event starts in {number} minutes",
+    "can someone help me with the {word} quest",
+    "this class is so boring",
+    "lol",
+    "what is the best weapon against the {word}",
+    "brb dinner",
+    "who wants to join my server, code {number}",
+    "the analysis of the update notes says the {word} got nerfed",
+]
+CHAT_WORDS = ["tornado", "flood", "meteor", "volcano", "blizzard",
+              "lobby", "map", "boss", "tsunami", "earthquake"]
+
+
+class SubstringScanMatcher:
+    """The original ThoughtPolice approach, a substring scan over the flat lists
+    followed by a section lookup of the found word."""
+
+    def __init__(self, raw_list: dict) -> None:
+        self.raw_list = raw_list
+        self.full_exact_match_list = []
+        self.full_any_match_list = []
+        for specs in raw_list.values():
+            self.full_exact_match_list += specs["exact_match_list"]
+            self.full_any_match_list += specs["any_match_list"]
+
+    def get_crime_type(self, offensive_word: str) -> str | None:
+        for crime_type, specs in self.raw_list.items():
+            if offensive_word in specs["exact_match_list"] \
+                    or offensive_word in specs["any_match_list"]:
+                return crime_type
+        return None
+
+    def match(self, content: str) -> tuple | None:
+        for any_match_word in self.full_any_match_list:
+            if any_match_word in content:
+                return any_match_word, self.get_crime_type(any_match_word)
+
+        for message_word in content.split(" "):
+            if message_word in self.full_exact_match_list:
+                return message_word, self.get_crime_type(message_word)
+
+        return None
+
+
+class CompiledEngine:
+    """The compiled matcher currently used by ThoughtPolice."""
+
+    def __init__(self, raw_list: dict) -> None:
+        self.matcher = CompiledMatcher(raw_list)
+
+    def match(self, content: str) -> tuple | None:
+        found = self.matcher.match(content)
+        if found is None:
+            return None
+        return found[0], self.matcher.crime_type(found[0])
+
+
+ENGINES = {
+    "substring_scan": SubstringScanMatcher,
+    "compiled": CompiledEngine,
+}
+
+
+def synthetic_word(rng: random.Random) -> str:
+    """Returns a random lowercase word that is unlikely to appear in chat."""
+
+    length = rng.randint(5, 10)
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def synthetic_raw_list(base_raw_list: dict, size: int, rng: random.Random) -> dict:
+    """Extends the offensive list with random words until
+    it contains roughly the set amount of words."""
+
+    raw_list = copy.deepcopy(base_raw_list)
+    sections = list(raw_list.values())
+    for i in range(size):
+        section = sections[i % len(sections)]
+        list_type = "any_match_list" if i % 2 else "exact_match_list"
+        section[list_type].append(synthetic_word(rng))
+    return raw_list
+
+
+def chat_corpus(amount: int, rng: random.Random) -> list[str]:
+    """Generates chat messages, some of them
+    contain offensive words from the real list."""
+
+    offensive_words = [word
+                       for specs in load_raw_list(OFFENSIVE_LIST_PATH).values()
+                       for word in specs["exact_match_list"] + specs["any_match_list"]]
+
+    corpus = []
+    for _ in range(amount):
+        message = rng.choice(CHAT_TEMPLATES).format(word=rng.choice(CHAT_WORDS),
+                                                    number=rng.randint(1, 500))
+        if rng.random() < 0.05:
+            # several offensive words in one message check the priority between them
+            message += " " + " ".join(rng.sample(offensive_words, rng.randint(1, 3)))
+        corpus.append(message)
+    return corpus
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Returns the value at the set fraction of an already sorted list."""
+
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_engine(engine_class, raw_list: dict, corpus: list[str]) -> dict:
+    """Measures the build time and the per message latency of a single engine."""
+
+    build_start = time.perf_counter()
+    engine = engine_class(raw_list)
+    build_seconds = time.perf_counter() - build_start
+
+    latencies = []
+    hits = 0
+    total_start = time.perf_counter()
+    for content in corpus:
+        start = time.perf_counter_ns()
+        if engine.match(content) is not None:
+            hits += 1
+        latencies.append((time.perf_counter_ns() - start) / 1000)
+    total_seconds = time.perf_counter() - total_start
+
+    latencies.sort()
+    return {
+        "build_seconds": round(build_seconds, 6),
+        "messages_per_second": round(len(corpus) / total_seconds, 1),
+        "p50_us": round(percentile(latencies, 0.50), 2),
+        "p99_us": round(percentile(latencies, 0.99), 2),
+        "mean_us": round(statistics.fmean(latencies), 2),
+        "hits": hits,
+    }
+
+
+def check_agreement(raw_list: dict, corpus: list[str]) -> None:
+    """Makes sure every engine returns the same (word, crime_type)
+    as the original scan for every message."""
+
+    reference = SubstringScanMatcher(raw_list)
+    engines = {engine_name: engine_class(raw_list)
+               for engine_name, engine_class in ENGINES.items()}
+    for content in corpus:
+        expected = reference.match(content)
+        for engine_name, engine in engines.items():
+            found = engine.match(content)
+            assert found == expected, \
+                f"{engine_name} found {found} instead of {expected} in {content!r}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the moderation matcher engines.")
+    parser.add_argument("--messages", type=int, default=2000,
+                        help="Amount of chat messages in the corpus.")
+    parser.add_argument("--sizes", type=int, nargs="*", default=WORD_LIST_SIZES,
+                        help="Sizes of the synthetic word lists.")
+    parser.add_argument("--engines", nargs="*", default=list(ENGINES),
+                        choices=list(ENGINES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output",
+                        help="Path of the json results, printed to stdout if not set.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = chat_corpus(args.messages, rng)
+    base_raw_list = load_raw_list(OFFENSIVE_LIST_PATH)
+
+    # the real list first, then the synthetic ones
+    word_lists = [("offensive_list", base_raw_list)]
+    for size in args.sizes:
+        raw_list = synthetic_raw_list(base_raw_list, size, rng)
+        word_lists.append((f"synthetic_{size}", raw_list))
+
+    results = []
+    for list_name, raw_list in word_lists:
+        word_count = sum(len(specs["exact_match_list"]) + len(specs["any_match_list"])
+                         for specs in raw_list.values())
+        check_agreement(raw_list, corpus)
+        for engine_name in args.engines:
+            result = run_engine(ENGINES[engine_name], raw_list, corpus)
+            result.update({"engine": engine_name,
+                           "word_list": list_name,
+                           "words": word_count})
+            results.append(result)
+            print(f"{list_name:>16} {engine_name:>15}: "
+                  f"{result['messages_per_second']:>12} msg/s, "
+                  f"p50 {result['p50_us']} us, p99 {result['p99_us']} us",
+                  file=sys.stderr)
+
+    report = {
+        "python": sys.version.split()[0],
+        "messages": len(corpus),
+        "seed": args.seed,
+        "results": results,
+    }
+
+    if args.output is None:
+        print(json.dumps(report, indent=4))
+    else:
+        with open(args.output, "w") as write:
+            json.dump(report, write, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import ast
+import os
+
+import discord
+
+from settings import PACKAGE_DIR
+
+
+class Capabilities:
+    """The gateway intents and caches a cog needs,
+    declared as CAPABILITIES in the cog's module."""
+
+    def __init__(self, intents=(), member_cache=(), max_messages: int = 0) -> None:
+        # names of discord.Intents flags, e.g. "members" or "message_content"
+        self.intents = tuple(intents)
+
+        # names of discord.MemberCacheFlags flags, e.g. "joined"
+        self.member_cache = tuple(member_cache)
+
+        # how many messages the cog needs cached, e.g. for on_message_edit
+        self.max_messages = max_messages
+
+
+def read_capabilities(module_name: str) -> Capabilities | None:
+    """Reads the CAPABILITIES declared by a cog module from its
+    source, without executing the module, which load_extension
+    does afterwards. The arguments have to be literals."""
+
+    path = os.path.join(PACKAGE_DIR, *module_name.split(".")) + ".py"
+    with open(path, "r", encoding="utf-8") as read:
+        tree = ast.parse(read.read(), path)
+
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+                isinstance(target, ast.Name) and target.id == "CAPABILITIES"
+                for target in node.targets):
+            call = node.value
+            if not isinstance(call, ast.Call):
+                raise ValueError(
+                    f"{module_name}: CAPABILITIES has to be a Capabilities(...) call")
+
+            args = [ast.literal_eval(argument) for argument in call.args]
+            kwargs = {keyword.arg: ast.literal_eval(keyword.value)
+                      for keyword in call.keywords}
+            return Capabilities(*args, **kwargs)
+
+    return None
+
+
+def combine_capabilities(
+        module_names: list[str]
+) -> tuple[discord.Intents, discord.MemberCacheFlags, int | None]:
+    """Combines the capabilities declared by the cog modules into the bot settings."""
+
+    # every cog needs the guild, its channels and roles
+    intents = discord.Intents.none()
+    intents.guilds = True
+
+    member_cache = discord.MemberCacheFlags.none()
+    max_messages = 0
+
+    for module_name in module_names:
+        capabilities = read_capabilities(module_name)
+        if capabilities is None:
+            continue
+
+        for flag in capabilities.intents:
+            setattr(intents, flag, True)
+        for flag in capabilities.member_cache:
+            setattr(member_cache, flag, True)
+        max_messages = max(max_messages, capabilities.max_messages)
+
+    # None disables the message cache
+    return intents, member_cache, max_messages or None
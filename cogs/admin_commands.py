@@ -1,14 +1,39 @@
+import asyncio
+import contextlib
+import time
+
 import discord
 from discord import app_commands
 from discord.app_commands import Choice
 from discord.ext import commands
-from discord.utils import get
+
+from capabilities import Capabilities
+from cogs.ban_index import BanIndex
 from discord_bot import CatastrophiaBot
+from message_cleaner import collect_messages, delete_messages
 from methods import embed_message
-from settings import get_secret
+from purge_job import PurgeJob, PurgeJobStore
+from settings import get_config, get_secret
 
 GUILD_ID = get_secret("GUILD_ID")
 
+# mutes fetch the members they need, which requires the members intent
+CAPABILITIES = Capabilities(intents=["members"])
+
+# the most messages /clear looks through to find the requested amount
+CLEAR_SCAN_LIMIT = get_config("CLEAR_SCAN_LIMIT")
+
+# how often the /purgeuser response is updated with the progress
+PURGE_PROGRESS_DELAY = get_config("PURGE_PROGRESS_DELAY")
+
+# durations of timed bans and mutes in seconds
+SANCTION_DURATION_CHOICES = [
+    Choice(name="1 hour", value=3600),
+    Choice(name="24 hours", value=86400),
+    Choice(name="7 days", value=604800),
+    Choice(name="30 days", value=2592000)
+]
+
 
 class AdminCommands(commands.Cog):
     """Cog containing commands regarding the server administration."""
@@ -16,6 +41,70 @@ class AdminCommands(commands.Cog):
     def __init__(self, bot: CatastrophiaBot) -> None:
         self.bot = bot
 
+        # running clear jobs, kept so they are not garbage collected
+        self.clear_jobs: set[asyncio.Task] = set()
+
+        # unfinished purges that can be resumed and the ones currently running
+        self.purge_jobs: PurgeJobStore | None = None
+        self.running_purges: dict[int, asyncio.Task] = {}
+
+        # lifting timed bans and mutes
+        bot.scheduler.register("unban", self.expire_ban)
+        bot.scheduler.register("unmute", self.expire_mute)
+
+        # running purges stop at their next checkpoint
+        # and are resumed with /purgeuser after a restart
+        bot.shutdown_manager.register("stop", "purges", self.stop_purges)
+        bot.shutdown_manager.register("flush", "purge jobs", self.save_purge_jobs)
+
+    async def cog_load(self) -> None:
+        """Reads the unfinished purges without blocking the other cogs."""
+
+        self.purge_jobs = await asyncio.to_thread(PurgeJobStore)
+
+    async def stop_purges(self) -> None:
+        """Cancels the running purges and waits for them to save their progress."""
+
+        for user_id in self.running_purges:
+            # a finished purge removes its job before
+            # its task is dropped from running_purges
+            job = self.purge_jobs.get(user_id)
+            if job is not None:
+                job.cancelled = True
+
+        await asyncio.gather(*self.running_purges.values(), return_exceptions=True)
+
+    async def save_purge_jobs(self) -> None:
+        if self.purge_jobs is not None:
+            self.purge_jobs.save_file()
+
+    async def expire_ban(self, payload: dict) -> None:
+        """Unbans a user whose timed ban has expired."""
+
+        guild = self.bot.get_guild(payload["guild_id"])
+        # the user might have been unbanned already
+        with contextlib.suppress(discord.NotFound):
+            await guild.unban(discord.Object(id=payload["user_id"]),
+                              reason="Timed ban expired")
+
+    async def expire_mute(self, payload: dict) -> None:
+        """Unmutes a user whose timed mute has expired."""
+
+        guild = self.bot.get_guild(payload["guild_id"])
+        member = await self.bot.member_resolver.resolve(guild, payload["user_id"])
+        role = self.bot.role_registry.get_muted_role()
+
+        if role is None:
+            # MUTED_ROLE_ID is not configured or the
+            # role was deleted, retrying would not help
+            print(f"AdminCommands - no muted role, can't unmute {payload['user_id']}.")
+            return
+
+        # the user might have left the server or been unmuted already
+        if member is not None and member.get_role(role.id) is not None:
+            await member.remove_roles(role, reason="Timed mute expired")
+            self.bot.member_resolver.forget(guild.id, member.id)
+
     @app_commands.command(
         name="clear",
         description="Clears all the messages from a set user."
@@ -25,37 +114,192 @@ class AdminCommands(commands.Cog):
             interaction: discord.Interaction,
             user: discord.User,
             channel: discord.TextChannel,
-            limit: int = 100) -> None:
+            limit: app_commands.Range[int, 1, CLEAR_SCAN_LIMIT] = 100) -> None:
         """Removes a desired amount of messages from a set user."""
 
-        # getting x amount of messages from the user
-        user_messages = []
-        i = 0
-        async for message in channel.history(limit=300):
-            # found the desired amount of messages
-            if i == limit:
-                break
-
-            if message.author == user:
-                user_messages.append(message)
-                i += 1
+        await interaction.response.send_message(embed_message(
+            f"Looking for the last {limit} message(s) from "
+            f"{user.display_name} ({user.name}) in #{channel.name}."
+        ), ephemeral=True)
+
+        # the removal runs in the background, the
+        # response is edited to show the progress
+        job = asyncio.create_task(self.clear_job(interaction, user, channel, limit))
+        self.clear_jobs.add(job)
+        job.add_done_callback(self.clear_jobs.discard)
+
+    @staticmethod
+    async def clear_job(interaction: discord.Interaction,
+                        user: discord.User,
+                        channel: discord.TextChannel,
+                        limit: int) -> None:
+        """Finds the user's messages and removes them while reporting the progress."""
+
+        # the interaction response can only be edited for
+        # 15 minutes, old messages are removed slowly
+        can_edit = True
+
+        async def report_progress(deleted: int) -> None:
+            nonlocal can_edit
+            if not can_edit:
+                return
+
+            try:
+                await interaction.edit_original_response(content=embed_message(
+                    f"Removing message(s) from {user.display_name} ({user.name}) "
+                    f"in #{channel.name}: {deleted}/{len(user_messages)}"
+                ))
+            except discord.HTTPException:
+                can_edit = False
+
+        try:
+            user_messages, scanned = await collect_messages(
+                channel,
+                lambda message: message.author.id == user.id,
+                limit,
+                CLEAR_SCAN_LIMIT
+            )
+            deleted = await delete_messages(channel, user_messages,
+                                            on_progress=report_progress)
+        except Exception as exception:
+            print(f"AdminCommands - clearing the messages of {user.name} "
+                  f"in #{channel.name} failed: {exception}")
+            result = (f"Failed to clear the messages from {user.display_name} "
+                      f"({user.name}) in #{channel.name}.")
+        else:
+            # final response with the real amount of removed messages
+            result = (f"Removed {deleted} last message(s) from {user.display_name} "
+                      f"({user.name}) in #{channel.name}. "
+                      f"Scanned {scanned} message(s).")
+
+        try:
+            await interaction.edit_original_response(content=embed_message(result))
+        except discord.HTTPException:
+            # the interaction expired during a long clear, followups
+            # use the same token, the result stays private
+            print(f"AdminCommands - {result}")
+
+    @app_commands.command(
+        name="purgeuser",
+        description="Removes the messages of a user from every channel of the server."
+    )
+    @app_commands.choices(time_window=[
+        Choice(name="Last hour", value=3600),
+        Choice(name="Last 24 hours", value=86400),
+        Choice(name="Last 7 days", value=604800),
+        Choice(name="Last 14 days", value=1209600),
+        Choice(name="Last 30 days", value=2592000)
+    ])
+    async def purgeuser(self,
+                        interaction: discord.Interaction,
+                        user: discord.User,
+                        time_window: Choice[int]) -> None:
+        """Starts a background job removing the user's
+        messages, or resumes an unfinished one."""
+
+        if user.id in self.running_purges:
+            await interaction.response.send_message(embed_message(
+                f"The messages of {user.display_name} ({user.name}) "
+                f"are already being purged."
+            ), ephemeral=True)
+            return
+
+        job = self.purge_jobs.get(user.id)
+        if job is None:
+            job = PurgeJob(user.id, time.time() - time_window.value)
+            self.purge_jobs.add(job)
+            action = "Started"
         else:
-            # found less than the desired images, so changing the amount
-            limit = i
+            # an unfinished job continues from its saved
+            # progress and keeps its original time window
+            job.cancelled = False
+            action = "Resumed"
+
+        await interaction.response.send_message(embed_message(
+            f"{action} purging the messages of {user.display_name} ({user.name}) "
+            f"from all channels."
+        ), ephemeral=True)
+
+        purge = asyncio.create_task(self.purge_user_job(interaction, user, job))
+        self.running_purges[user.id] = purge
+        purge.add_done_callback(lambda _: self.running_purges.pop(user.id, None))
+
+    @app_commands.command(
+        name="purgeuser_cancel",
+        description="Stops purging the messages of a user, "
+                    "the purge can be resumed later."
+    )
+    async def purgeuser_cancel(self,
+                               interaction: discord.Interaction,
+                               user: discord.User) -> None:
+        """Cancels a running purge job."""
+
+        job = self.purge_jobs.get(user.id)
+        if user.id not in self.running_purges or job is None:
+            await interaction.response.send_message(embed_message(
+                f"The messages of {user.display_name} ({user.name}) "
+                f"are not being purged."
+            ), ephemeral=True)
+            return
+
+        job.cancelled = True
+        await interaction.response.send_message(embed_message(
+            f"Cancelling the purge of {user.display_name} ({user.name})."
+        ), ephemeral=True)
 
-        # bot response
-        await interaction.response.send_message(
-            embed_message(
-                f"Removed {limit} last message(s) from {user.display_name} ({user.name}) in #{channel.name}."),
-            ephemeral=True
-        )
+    async def purge_user_job(self,
+                             interaction: discord.Interaction,
+                             user: discord.User,
+                             job: PurgeJob) -> None:
+        """Runs a purge job while periodically saving and reporting its progress."""
+
+        async def report_progress() -> None:
+            # the interaction response can only be edited for
+            # 15 minutes, the progress is saved regardless
+            can_edit = True
+            while True:
+                await asyncio.sleep(PURGE_PROGRESS_DELAY)
+                self.purge_jobs.save_file()
+
+                if can_edit:
+                    try:
+                        await interaction.edit_original_response(content=embed_message(
+                            f"Purging {user.display_name} ({user.name}): "
+                            f"removed {job.deleted} message(s), "
+                            f"scanned {job.scanned} message(s) in "
+                            f"{len(job.finished_channels)} finished channel(s)."
+                        ))
+                    except discord.HTTPException:
+                        can_edit = False
+
+        reporter = asyncio.create_task(report_progress())
+        try:
+            await job.run(interaction.guild)
+        finally:
+            reporter.cancel()
+
+        if job.cancelled:
+            self.purge_jobs.save_file()
+            result = (f"Cancelled the purge of {user.display_name} ({user.name}) "
+                      f"after removing {job.deleted} message(s). "
+                      f"Use /purgeuser to resume it.")
+        else:
+            self.purge_jobs.remove(user.id)
+            result = (f"Purged {job.deleted} message(s) of "
+                      f"{user.display_name} ({user.name}), "
+                      f"scanned {job.scanned} message(s).")
 
-        # message removal
-        await channel.delete_messages(user_messages)
+        try:
+            await interaction.edit_original_response(content=embed_message(result))
+        except discord.HTTPException:
+            # the interaction expired during a long purge, followups
+            # use the same token, the result stays private
+            print(f"AdminCommands - {result}")
 
     @app_commands.command(
         name="ban",
-        description="Permanently bans a user from the discord server."
+        description="Bans a user from the discord server, "
+                    "permanently or for a set time."
     )
     @app_commands.choices(delete_messages=[
         Choice(name="None", value=0),
@@ -64,22 +308,42 @@ class AdminCommands(commands.Cog):
         Choice(name="Last 24 hours", value=86400),
         Choice(name="Last 2 days", value=172800),
         Choice(name="Last 7 days", value=604800)
-    ])
+    ], duration=SANCTION_DURATION_CHOICES)
     async def ban(self,
                   interaction: discord.Interaction,
                   user: discord.User,
                   delete_messages: Choice[int],
-                  reason: str | None = None):
-        """Bans a user."""
+                  reason: str | None = None,
+                  duration: Choice[int] | None = None):
+        """Bans a user, a ban with a duration is lifted automatically."""
+
+        guild = interaction.channel.guild
+
+        # banning through the guild also works for users that are not members
+        try:
+            await guild.ban(user, delete_message_seconds=delete_messages.value,
+                            reason=reason)
+        except discord.HTTPException as exception:
+            await interaction.response.send_message(embed_message(
+                f"Failed to ban {user.display_name} (@{user.name}): {exception}"
+            ), ephemeral=True)
+            return
 
-        member: discord.Member = interaction.channel.guild.get_member(user.id)
+        # the unban is only scheduled once the ban went through
+        if duration is None:
+            # a permanent ban replaces a timed one
+            self.bot.scheduler.cancel(f"unban:{user.id}")
+            ban_length = "permanently"
+        else:
+            self.bot.scheduler.schedule(f"unban:{user.id}", "unban",
+                                        {"guild_id": guild.id, "user_id": user.id},
+                                        time.time() + duration.value)
+            ban_length = f"for {duration.name}"
 
         await interaction.response.send_message(embed_message(
-            f"Banned permanently {user.display_name} (@{user.name}) for {reason}."
+            f"Banned {ban_length} {user.display_name} (@{user.name}) for {reason}."
         ), ephemeral=True)
 
-        await member.ban(delete_message_seconds=delete_messages.value, reason=reason)
-
     @app_commands.command(
         name="unban",
         description="Unbans a user from the discord server."
@@ -87,20 +351,28 @@ class AdminCommands(commands.Cog):
     async def unban(self,
                     interaction: discord.Interaction,
                     username: str):
-        """Unbans a user with the set username from the discord server."""
+        """Unbans a user with the set username,
+        display name or id from the discord server."""
 
         # retrieves guild
         guild = interaction.channel.guild
 
-        # gets all banned users in the guild
-        banned_users = guild.bans(limit=None)
-        unban_entry: discord.BanEntry | None = None
+        # the bans are looked up in the index instead
+        # of fetching all of them from discord
+        ban_index: BanIndex = self.bot.get_cog("BanIndex")
+        if not ban_index.loaded.is_set():
+            if ban_index.load_error is not None:
+                message = (f"The list of bans could not be loaded "
+                           f"({ban_index.load_error}), retrying in the background.")
+            else:
+                message = ("The list of bans is still loading, "
+                           "please try again in a moment.")
 
-        # checks for every banned user if his name doesn't equal the requested username
-        async for ban_entry in banned_users:
-            if ban_entry.user.name == username:
-                unban_entry = ban_entry
-                break
+            await interaction.response.send_message(embed_message(message),
+                                                    ephemeral=True)
+            return
+
+        unban_entry = ban_index.resolve(username)
 
         if unban_entry is not None:
             # found the banned user -> unbanning
@@ -110,33 +382,64 @@ class AdminCommands(commands.Cog):
             ), ephemeral=True)
 
             await guild.unban(unban_entry.user)
+            self.bot.scheduler.cancel(f"unban:{unban_entry.user.id}")
         else:
             # did not find the banned user
             await interaction.response.send_message(embed_message(
                 f"There is no user banned with the name '{username}'."
             ))
 
+    @unban.autocomplete("username")
+    async def unban_username_autocomplete(self,
+                                          _interaction: discord.Interaction,
+                                          current: str) -> list[Choice[str]]:
+        """Suggests banned usernames."""
+
+        ban_index: BanIndex = self.bot.get_cog("BanIndex")
+        return ban_index.autocomplete(current)
+
     @app_commands.command(
         name="mute",
-        description="Permanently mutes a user."
+        description="Mutes a user, permanently or for a set time."
     )
+    @app_commands.choices(duration=SANCTION_DURATION_CHOICES)
     async def mute(self,
                    interaction: discord.Interaction,
-                   user: discord.User):
-        """Mutes a user by giving him a muted role."""
+                   user: discord.User,
+                   duration: Choice[int] | None = None):
+        """Mutes a user by giving him a muted role, a
+        mute with a duration is lifted automatically."""
 
         # fetching the member class and the muted role
         guild = interaction.channel.guild
-        member: discord.Member = guild.get_member(user.id)
-        role = get(guild.roles, name="muted")
+        member = await self.bot.member_resolver.resolve(guild, user.id)
+        role = self.bot.role_registry.get_muted_role()
 
-        if member.get_role(role.id) is None:
+        if role is None:
+            await interaction.response.send_message(embed_message(
+                "The muted role is not configured."
+            ), ephemeral=True)
+        elif member is None:
+            await interaction.response.send_message(embed_message(
+                f"The user {user.display_name} ({user.name}) "
+                f"is not a member of the server."
+            ))
+        elif member.get_role(role.id) is None:
             # user is not already muted -> give muted role
+            if duration is None:
+                mute_length = "permanently"
+            else:
+                self.bot.scheduler.schedule(f"unmute:{user.id}", "unmute",
+                                            {"guild_id": guild.id, "user_id": user.id},
+                                            time.time() + duration.value)
+                mute_length = f"for {duration.name}"
+
             await interaction.response.send_message(embed_message(
-                f"Muted {user.display_name} ({user.name})."
+                f"Muted {mute_length} {user.display_name} ({user.name})."
             ))
 
             await member.add_roles(role)
+            self.bot.member_resolver.forget(guild.id, member.id)
         else:
             # user is already muted
             await interaction.response.send_message(embed_message(
@@ -154,16 +457,27 @@ class AdminCommands(commands.Cog):
 
         # fetching the member class and the muted role
         guild = interaction.channel.guild
-        member: discord.Member = guild.get_member(user.id)
-        role = get(guild.roles, name="muted")
+        member = await self.bot.member_resolver.resolve(guild, user.id)
+        role = self.bot.role_registry.get_muted_role()
 
-        if member.get_role(role.id) is not None:
+        if role is None:
+            await interaction.response.send_message(embed_message(
+                "The muted role is not configured."
+            ), ephemeral=True)
+        elif member is None:
+            await interaction.response.send_message(embed_message(
+                f"The user {user.display_name} ({user.name}) "
+                f"is not a member of the server."
+            ))
+        elif member.get_role(role.id) is not None:
             # user was muted -> removes the role and in doing so unmutes the user
             await interaction.response.send_message(embed_message(
                 f"Unmuted {user.display_name} ({user.name})."
             ))
 
             await member.remove_roles(role)
+            self.bot.member_resolver.forget(guild.id, member.id)
+            self.bot.scheduler.cancel(f"unmute:{user.id}")
         else:
             # user wasn't muted
             await interaction.response.send_message(embed_message(
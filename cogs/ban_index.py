@@ -0,0 +1,175 @@
+import asyncio
+import bisect
+
+import discord
+from discord.app_commands import Choice
+from discord.ext import commands
+
+from capabilities import Capabilities
+from discord_bot import CatastrophiaBot
+from settings import get_secret
+
+GUILD_ID = get_secret("GUILD_ID")
+
+# ban events keep the index current
+CAPABILITIES = Capabilities(intents=["moderation"])
+
+# discord shows at most 25 autocomplete choices
+MAX_AUTOCOMPLETE_CHOICES = 25
+
+# delay before fetching the bans again after a failed load, in seconds
+BAN_LOAD_RETRY_DELAY = 60
+
+
+class BanIndex(commands.Cog):
+    """Cog keeping an in-memory index of the server bans,
+    loaded once and kept current from ban events."""
+
+    def __init__(self, bot: CatastrophiaBot) -> None:
+        self.bot = bot
+
+        # user id -> ban entry
+        self.entries: dict[int, discord.BanEntry] = {}
+
+        # lowercased names -> user id
+        self.by_name: dict[str, int] = {}
+        self.by_display_name: dict[str, int] = {}
+
+        # sorted lowercased usernames for autocomplete
+        self.sorted_names: list[str] = []
+
+        self.loaded = asyncio.Event()
+
+        # error of the last failed load, the load is retried until it succeeds
+        self.load_error: str | None = None
+        self.load_task: asyncio.Task | None = None
+
+    async def cog_load(self) -> None:
+        """Loads the bans in the background once the bot is ready."""
+
+        self.load_task = asyncio.create_task(self.load_bans())
+
+    async def load_bans(self) -> None:
+        """Fetches all bans of the server once, retrying until the fetch succeeds."""
+
+        await self.bot.wait_until_ready()
+
+        guild = self.bot.get_guild(GUILD_ID)
+        while True:
+            try:
+                async for ban_entry in guild.bans(limit=None):
+                    self.add_entry(ban_entry)
+            except discord.HTTPException as exception:
+                # missing ban permission or a failed
+                # request, the partial index is discarded
+                self.load_error = str(exception)
+                print(f"BanIndex - failed to load the bans, "
+                      f"retrying in {BAN_LOAD_RETRY_DELAY} s: {exception}")
+                for user_id in list(self.entries):
+                    self.remove_entry(user_id)
+                await asyncio.sleep(BAN_LOAD_RETRY_DELAY)
+            else:
+                break
+
+        self.load_error = None
+        self.loaded.set()
+        print(f"Ban index loaded {len(self.entries)} ban(s).")
+
+    def add_entry(self, ban_entry: discord.BanEntry) -> None:
+        """Adds a ban to the index."""
+
+        user = ban_entry.user
+        if user.id in self.entries:
+            self.remove_entry(user.id)
+
+        self.entries[user.id] = ban_entry
+
+        name = user.name.lower()
+        self.by_name[name] = user.id
+        self.by_display_name[user.display_name.lower()] = user.id
+        bisect.insort(self.sorted_names, name)
+
+    def remove_entry(self, user_id: int) -> None:
+        """Removes a ban from the index."""
+
+        ban_entry = self.entries.pop(user_id, None)
+        if ban_entry is None:
+            return
+
+        name = ban_entry.user.name.lower()
+        if self.by_name.get(name) == user_id:
+            del self.by_name[name]
+
+        display_name = ban_entry.user.display_name.lower()
+        if self.by_display_name.get(display_name) == user_id:
+            del self.by_display_name[display_name]
+
+        index = bisect.bisect_left(self.sorted_names, name)
+        if index < len(self.sorted_names) and self.sorted_names[index] == name:
+            del self.sorted_names[index]
+
+    def resolve(self, query: str) -> discord.BanEntry | None:
+        """Finds a ban by the user's id, username or display name."""
+
+        query = query.strip()
+        if query.isdigit() and int(query) in self.entries:
+            return self.entries[int(query)]
+
+        query = query.lower()
+        user_id = self.by_name.get(query)
+        if user_id is None:
+            user_id = self.by_display_name.get(query)
+
+        if user_id is None:
+            return None
+        return self.entries[user_id]
+
+    def autocomplete(self, current: str) -> list[Choice[str]]:
+        """Returns the banned usernames starting with the current input."""
+
+        prefix = current.lower()
+        start = bisect.bisect_left(self.sorted_names, prefix)
+
+        choices = []
+        for name in self.sorted_names[start:start + MAX_AUTOCOMPLETE_CHOICES]:
+            if not name.startswith(prefix):
+                break
+
+            user = self.entries[self.by_name[name]].user
+            choices.append(Choice(name=f"{user.name} ({user.display_name})"[:100],
+                                  value=user.name))
+
+        return choices
+
+    @commands.Cog.listener()
+    async def on_member_ban(self, guild: discord.Guild, user: discord.User):
+        """Adds new bans to the index."""
+
+        if guild.id != GUILD_ID:
+            return
+
+        # the ban reason is only available from the ban itself
+        try:
+            ban_entry = await guild.fetch_ban(user)
+        except discord.HTTPException:
+            ban_entry = discord.BanEntry(reason=None, user=user)
+
+        self.add_entry(ban_entry)
+
+    @commands.Cog.listener()
+    async def on_member_unban(self, guild: discord.Guild, user: discord.User):
+        """Removes lifted bans from the index."""
+
+        if guild.id != GUILD_ID:
+            return
+
+        self.remove_entry(user.id)
+
+
+async def setup(bot: CatastrophiaBot) -> None:
+    """Cog setup."""
+
+    await bot.add_cog(
+        BanIndex(bot),
+        guilds=[discord.Object(id=GUILD_ID)]
+    )
@@ -0,0 +1,105 @@
+import os
+import time
+from collections import Counter
+
+import discord
+from discord import app_commands
+from discord.ext import commands, tasks
+
+from capabilities import Capabilities
+from discord_bot import CatastrophiaBot
+from methods import embed_message
+from settings import get_config, get_secret
+
+GUILD_ID = get_secret("GUILD_ID")
+
+# how often the resource report is printed, in seconds
+DIAGNOSTICS_REPORT_DELAY = get_config("DIAGNOSTICS_REPORT_DELAY")
+
+# event types listed in a report
+REPORTED_EVENT_TYPES = 10
+
+CAPABILITIES = Capabilities()
+
+
+def resident_memory() -> int:
+    """Returns the resident memory of the process in bytes."""
+
+    try:
+        with open("/proc/self/statm", "r") as read:
+            return int(read.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # not on linux, the peak resident memory is the closest available value
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Diagnostics(commands.Cog):
+    """Cog counting received gateway events and reporting the memory of the bot,
+    used to compare the declared intents with discord.Intents.all()."""
+
+    def __init__(self, bot: CatastrophiaBot) -> None:
+        self.bot = bot
+
+        # gateway event type -> amount received since the start
+        self.events: Counter[str] = Counter()
+        self.started_at = time.time()
+
+        self.print_report.start()
+
+    async def cog_unload(self) -> None:
+        self.print_report.cancel()
+
+    def report(self) -> str:
+        """Formats the memory, caches and event volume of the bot."""
+
+        hours = max(time.time() - self.started_at, 1) / 3600
+        events = sum(self.events.values())
+        guild = self.bot.get_guild(GUILD_ID)
+
+        lines = [
+            f"Resident memory: {resident_memory() / 1048576:.1f} MiB",
+            f"Intents: {self.bot.intents.value}",
+            f"Cached members: {0 if guild is None else len(guild.members)}",
+            f"Cached messages: {len(self.bot.cached_messages)}",
+            f"Gateway events: {events} ({events / hours:.0f} per hour)"
+        ]
+        top_events = self.events.most_common(REPORTED_EVENT_TYPES)
+        lines += [f"  {event_type}: {count}" for event_type, count in top_events]
+        return "\n".join(lines)
+
+    @tasks.loop(seconds=DIAGNOSTICS_REPORT_DELAY)
+    async def print_report(self):
+        """Prints the report periodically."""
+
+        await self.bot.wait_until_ready()
+        print(self.report())
+
+    @commands.Cog.listener()
+    async def on_socket_event_type(self, event_type: str):
+        """Counts every received gateway event."""
+
+        self.events[event_type] += 1
+
+    @app_commands.command(
+        name="bot_stats",
+        description="Shows the memory usage and gateway event volume of the bot."
+    )
+    async def stats(self, interaction: discord.Interaction) -> None:
+        if not interaction.permissions.administrator:
+            await interaction.response.send_message(embed_message(
+                "Only administrators can see the bot stats."
+            ), ephemeral=True)
+            return
+
+        await interaction.response.send_message(embed_message(self.report()),
+                                                ephemeral=True)
+
+
+async def setup(bot: CatastrophiaBot) -> None:
+    """Cog setup."""
+
+    await bot.add_cog(
+        Diagnostics(bot),
+        guilds=[discord.Object(id=GUILD_ID)]
+    )
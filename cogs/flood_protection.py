@@ -0,0 +1,138 @@
+import time
+
+import discord
+from discord.ext import commands, tasks
+
+from capabilities import Capabilities
+from discord_bot import CatastrophiaBot
+from methods import embed_message
+from metrics import MESSAGES_SCANNED, MODERATION_VERDICTS
+from rate_tracker import DuplicateTracker, RateTracker, current_tick
+from settings import get_config, get_secret
+
+GUILD_ID = get_secret("GUILD_ID")
+
+# duplicate detection reads the message content
+CAPABILITIES = Capabilities(intents=["guild_messages", "message_content"])
+
+# message rate limits within the window (in seconds)
+FLOOD_WINDOW = get_config("FLOOD_WINDOW")
+FLOOD_USER_LIMIT = get_config("FLOOD_USER_LIMIT")
+FLOOD_CHANNEL_LIMIT = get_config("FLOOD_CHANNEL_LIMIT")
+FLOOD_GUILD_LIMIT = get_config("FLOOD_GUILD_LIMIT")
+FLOOD_DUPLICATE_LIMIT = get_config("FLOOD_DUPLICATE_LIMIT")
+FLOOD_MAX_TRACKED_USERS = get_config("FLOOD_MAX_TRACKED_USERS")
+
+# flood mutes are lifted by the scheduler after this long, in seconds
+FLOOD_MUTE_DURATION = get_config("FLOOD_MUTE_DURATION")
+
+# counters use buckets of a single second
+BUCKET_SECONDS = 1
+
+
+class FloodProtection(commands.Cog):
+    """Cog that mutes users who flood the server with messages."""
+
+    def __init__(self, bot: CatastrophiaBot) -> None:
+        self.bot = bot
+
+        window_size = FLOOD_WINDOW // BUCKET_SECONDS
+        self.user_rates = RateTracker(window_size, FLOOD_MAX_TRACKED_USERS)
+        self.channel_rates = RateTracker(window_size, FLOOD_MAX_TRACKED_USERS)
+        self.guild_rates = RateTracker(window_size, FLOOD_MAX_TRACKED_USERS)
+        self.duplicates = DuplicateTracker(window_size, FLOOD_DUPLICATE_LIMIT * 2,
+                                           FLOOD_MAX_TRACKED_USERS)
+
+        # users muted since the last eviction, avoids muting
+        # a user again before discord updates their roles
+        self.recently_muted: set[int] = set()
+
+        self.evict_stale_keys.start()
+
+    async def cog_unload(self) -> None:
+        """Stops the eviction of stale keys."""
+
+        self.evict_stale_keys.cancel()
+
+    @tasks.loop(minutes=1)
+    async def evict_stale_keys(self):
+        """Forgets users, channels and guilds that have
+        not sent any message during the last window."""
+
+        tick = current_tick(BUCKET_SECONDS)
+        for tracker in (self.user_rates, self.channel_rates,
+                        self.guild_rates, self.duplicates):
+            tracker.evict_stale(tick)
+
+        self.recently_muted.clear()
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        """Tracks message rates and mutes users that exceed them."""
+
+        # ignoring direct messages and bots
+        if message.guild is None or message.author.bot:
+            return
+
+        member = message.author
+        if not isinstance(member, discord.Member) \
+                or member.guild_permissions.manage_messages:
+            return
+
+        MESSAGES_SCANNED.inc(("flood_protection",))
+
+        tick = current_tick(BUCKET_SECONDS)
+        user_rate = self.user_rates.hit(member.id, tick)
+        channel_rate = self.channel_rates.hit(message.channel.id, tick)
+        guild_rate = self.guild_rates.hit(message.guild.id, tick)
+        duplicate_count = self.duplicates.hit(member.id, message.content, tick)
+
+        # during a raid the limit for individual users is stricter
+        user_limit = FLOOD_USER_LIMIT
+        if channel_rate > FLOOD_CHANNEL_LIMIT or guild_rate > FLOOD_GUILD_LIMIT:
+            user_limit = max(FLOOD_USER_LIMIT // 2, 1)
+
+        if user_rate > user_limit:
+            await self.mute_flooder(message, "sending too many messages")
+        elif message.content and duplicate_count > FLOOD_DUPLICATE_LIMIT:
+            await self.mute_flooder(message, "repeating the same message")
+
+    async def mute_flooder(self, message: discord.Message, reason: str) -> None:
+        """Mutes the author of the message by giving them the muted role."""
+
+        member: discord.Member = message.author
+        if member.id in self.recently_muted:
+            return
+
+        role = self.bot.role_registry.get_muted_role()
+        if role is None or member.get_role(role.id) is not None:
+            return
+
+        self.recently_muted.add(member.id)
+
+        try:
+            await member.add_roles(role, reason=f"Flood protection: {reason}")
+        except discord.HTTPException as exception:
+            print(f"FloodProtection - failed to mute {member.name}: {exception}")
+            return
+
+        MODERATION_VERDICTS.inc(("flood_protection", "mute"))
+
+        # lifted like a timed /mute, /unmute cancels it
+        self.bot.scheduler.schedule(f"unmute:{member.id}", "unmute",
+                                    {"guild_id": member.guild.id, "user_id": member.id},
+                                    time.time() + FLOOD_MUTE_DURATION)
+
+        await message.channel.send(embed_message(
+            f"Muted {member.display_name} ({member.name}) "
+            f"for {FLOOD_MUTE_DURATION // 60} minutes for {reason}."
+        ))
+
+
+async def setup(bot: CatastrophiaBot) -> None:
+    """Cog setup."""
+
+    await bot.add_cog(
+        FloodProtection(bot),
+        guilds=[discord.Object(id=GUILD_ID)]
+    )
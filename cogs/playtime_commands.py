@@ -1,40 +1,50 @@
 import asyncio
 import json
+import time
+from datetime import datetime
 
 import discord
 import requests
-import requests
 from discord import app_commands
+from discord.app_commands import Choice
 from discord.ext import commands, tasks
-from discord.utils import get
+
+from api_client import api_request
+from capabilities import Capabilities
 from discord_bot import CatastrophiaBot
-from settings import get_secret, get_config
-from methods import embed_message, format_playtime, error_message
+from leaderboard_view import LEADERBOARD_PAGE_SIZE, LeaderboardView, render_pages
+from lifecycle import stop_loop
+from methods import embed_message, error_message, format_playtime
+from metrics import ROLE_EDITS
+from playtime_gains import GainTracker
+from playtime_history import PlaytimeHistory
+from ranking import rank_players, render_gainers, render_sections
+from settings import get_config, get_secret, package_path
 
 GUILD_ID = get_secret("GUILD_ID")
+
+# role sync fetches the linked members it needs, which requires the members intent
+CAPABILITIES = Capabilities(intents=["members"])
+
 TOP_PLAYERS_CHANNEL = get_config("TOP_PLAYERS_CHANNEL")
 
 # constants for requests
-CATASTROPHIA_API_URL = get_secret("CATASTROPHIA_API_URL")
-API_KEY_HEADERS = {
-    "api-key": get_secret("API_KEY")
-}
 REQUEST_ENDPOINT = get_config("REQUEST_ENDPOINT")
 TOP_TIMES_ENDPOINT = get_config("TOP_TIMES_ENDPOINT")
 
 # command constants
 MIN_TOP_PLAYERS = get_config("MIN_TOP_PLAYERS")
 MAX_TOP_PLAYERS = get_config("MAX_TOP_PLAYERS")
+LeaderboardPosition = app_commands.Range[int, MIN_TOP_PLAYERS, MAX_TOP_PLAYERS]
 CONFIDENTIAL_USERNAMES = get_config("CONFIDENTIAL_USERNAMES")
 TOP_PLAYERS_UPDATE_DELAY = get_config("TOP_PLAYERS_UPDATE_DELAY")
+GAINERS_WINDOWS = get_config("GAINERS_WINDOWS")
+TOP_GAINERS_AMOUNT = get_config("TOP_GAINERS_AMOUNT")
 
-TOP_10_ROLE_ID = get_config("TOP_10_ROLE_ID")
-TOP_25_ROLE_ID = get_config("TOP_25_ROLE_ID")
-TOP_50_ROLE_ID = get_config("TOP_50_ROLE_ID")
-TOP_75_ROLE_ID = get_config("TOP_75_ROLE_ID")
-TOP_100_ROLE_ID = get_config("TOP_100_ROLE_ID")
+PLAYERS_WITH_TOP_ROLES_PATH = package_path("players_with_top_roles.json")
 
-PLAYERS_WITH_TOP_ROLES_PATH = "./players_with_top_roles.json"
+# maximum amount of lines shown by /playtime_history
+MAX_HISTORY_LINES = 15
 
 
 class PlaytimeCommands(commands.Cog):
@@ -43,34 +53,97 @@ class PlaytimeCommands(commands.Cog):
     def __init__(self, bot: CatastrophiaBot) -> None:
         self.bot = bot
 
+        # loaded in cog_load
+        self.temp_players_with_top_roles: list[int] = []
+
+        # every fetched playtime is recorded, so gains
+        # can be computed without asking the API
+        self.history: PlaytimeHistory | None = None
+
+        # playtime gained in the last days, updated with every
+        # leaderboard snapshot instead of rescanning the history
+        self.gains = GainTracker(GAINERS_WINDOWS, excluded=CONFIDENTIAL_USERNAMES)
+
+        # /leaderboard pages rendered from the
+        # latest snapshot, replaced on every refresh
+        self.leaderboard_pages: list[str] = []
+
+        # held during a refresh, the shutdown lets
+        # a running refresh finish its role edits
+        self.refresh_lock = asyncio.Lock()
+        bot.shutdown_manager.register(
+            "stop", "leaderboard refresh",
+            lambda: stop_loop(self.print_top_players, self.refresh_lock)
+        )
+        bot.shutdown_manager.register("flush", "top role holders",
+                                      self.save_players_with_top_roles)
+
+    def load_state(self) -> None:
+        """Reads the saved top role holders and the
+        playtime history, blocks on file reads."""
+
         with open(PLAYERS_WITH_TOP_ROLES_PATH, "r") as read:
             self.temp_players_with_top_roles = json.load(read)
 
+        self.history = PlaytimeHistory()
+        self.gains.seed(self.history)
+
+    async def cog_load(self) -> None:
+        """Loads the state without blocking the other
+        cogs and starts the hourly leaderboard."""
+
+        await asyncio.to_thread(self.load_state)
+
+        # the history only knows lowercased usernames,
+        # the spelling of linked usernames is kept
+        self.bot.username_index.add_many(self.history.latest, replace=False)
+
         self.print_top_players.start()
 
-    async def attempt_role_assign(self, roblox_username: str, position: int, top_roles: list):
-        discord_id: int = self.bot.link_manager.get_discord_id(roblox_username)
-        if discord_id is not None:
-            member: discord.Member = self.bot.get_guild(GUILD_ID).get_member(discord_id)
-            selected_role = None
-
-            if position <= 10:
-                selected_role = 0
-            elif position <= 25:
-                selected_role = 1
-            elif position <= 50:
-                selected_role = 2
-            elif position <= 75:
-                selected_role = 3
-            elif position <= 100:
-                selected_role = 4
-
-            if selected_role is not None:
-                self.temp_players_with_top_roles.append(discord_id)
-                await member.add_roles(top_roles[selected_role])
+    async def cog_unload(self) -> None:
+        self.print_top_players.cancel()
+        self.history.close()
+
+    def record_playtimes(self,
+                         playtimes: dict[str, int],
+                         snapshot: bool = False) -> None:
+        """Saves fetched playtimes to the history, the leaderboard
+        snapshots also update the rolling gains. Single /playtime lookups
+        are only recorded, the players are not followed between them."""
+
+        self.history.record(playtimes)
+        if snapshot:
+            self.gains.update(playtimes)
+
+    async def attempt_role_assign(self,
+                                  member: discord.Member | None,
+                                  tier: int,
+                                  top_roles: list):
+        """Gives the linked discord member of a player the role of their tier."""
+
+        # the member might have left the server
+        if member is None:
+            return
+
+        role = top_roles[tier]
+        if role is not None:
+            self.temp_players_with_top_roles.append(member.id)
+            ROLE_EDITS.inc(("add",))
+            await member.add_roles(role)
+            self.bot.member_resolver.forget(member.guild.id, member.id)
+
+    async def save_players_with_top_roles(self) -> None:
+        with open(PLAYERS_WITH_TOP_ROLES_PATH, "w") as write:
+            json.dump(self.temp_players_with_top_roles, write, indent=4)
 
     @tasks.loop(hours=1)
     async def print_top_players(self):
+        """Refreshes the leaderboard while holding the refresh lock."""
+
+        async with self.refresh_lock:
+            await self.refresh_top_players()
+
+    async def refresh_top_players(self):
         """Sends a list with a desired amount of top ranking players."""
 
         await self.bot.wait_until_ready()
@@ -78,22 +151,13 @@ class PlaytimeCommands(commands.Cog):
         if not self.bot.is_ready():
             return
 
-        amount = 100
+        amount = MAX_TOP_PLAYERS
         channel = self.bot.get_channel(TOP_PLAYERS_CHANNEL)
 
         await channel.purge(limit=100)
 
-        # setting the limit for the amount argument
-        if amount < MIN_TOP_PLAYERS or amount > MAX_TOP_PLAYERS:
-            await interaction.response.send_message(embed_message(
-                f"The limit for the amount is between {MIN_TOP_PLAYERS} and {MAX_TOP_PLAYERS}."
-            ))
-            return
-
         try:
-            requested_url = CATASTROPHIA_API_URL + TOP_TIMES_ENDPOINT
-            response = requests.get(requested_url, params={"amount": amount}, headers=API_KEY_HEADERS,
-                                    timeout=5)
+            response = api_request("GET", TOP_TIMES_ENDPOINT, params={"amount": amount})
         except requests.exceptions.RequestException as e:
             await error_message(self.bot, "Server offline", e)
             return
@@ -105,51 +169,56 @@ class PlaytimeCommands(commands.Cog):
             await error_message(self.bot, "/toptimes", exception, response_text=response.text)
             return
         else:
-            top_times_dict = response.json()
-            top_times_dict = dict(sorted(top_times_dict.items(), key=lambda item: item[1], reverse=True))
+            top_times = response.json()
+            leaderboard = rank_players(top_times)
+            self.record_playtimes(top_times, snapshot=True)
+            self.bot.username_index.add_many(top_times)
+            self.leaderboard_pages = render_pages(leaderboard, int(time.time()))
 
         guild = self.bot.get_guild(GUILD_ID)
-        top_roles = [
-            get(guild.roles, name="Top 10"),
-            get(guild.roles, name="Top 25"),
-            get(guild.roles, name="Top 50"),
-            get(guild.roles, name="Top 75"),
-            get(guild.roles, name="Top 100"),
-        ]
-
-        for user_id in self.temp_players_with_top_roles:
-            member = guild.get_member(user_id)
-            if member is not None:
-                for role in top_roles:
-                    member_role = member.get_role(role.id)
-                    if member_role is not None:
-                        await member.remove_roles(role)
+        # resolved once by the role registry, ordered from the highest tier
+        top_roles = self.bot.role_registry.get_tier_roles()
+
+        # the members of the previous top players are fetched at once
+        previous_members = await self.bot.member_resolver.resolve_many(
+            guild, self.temp_players_with_top_roles)
+        for member in previous_members.values():
+            for role in top_roles:
+                if role is None:
+                    continue
+
+                member_role = member.get_role(role.id)
+                if member_role is not None:
+                    ROLE_EDITS.inc(("remove",))
+                    await member.remove_roles(role)
 
         self.temp_players_with_top_roles = []
 
-        # formatting the dictionary with the top times into a string message
-        message = ""
-        for i, pair in enumerate(top_times_dict.items()):
-            position = i + 1
-
-            username, playtime = pair
-            message += f"{position}: {username} - {format_playtime(playtime)}\n"
-
-            await self.attempt_role_assign(username, position, top_roles)
+        # sending the top times in sections of 25 players
+        for section in render_sections(leaderboard):
+            await channel.send(embed_message(section))
 
-            # dividing message to 10 sections
-            if position % 25 == 0 or position == len(top_times_dict):
-                # removing last line break
-                message = message[:-1]
+        # the rolling gains of everyone, not only the current top players
+        display_names = {username.lower(): username for username in top_times}
+        for days in GAINERS_WINDOWS:
+            gainers = self.gains.top(days, TOP_GAINERS_AMOUNT)
+            if gainers:
+                await channel.send(embed_message(
+                    render_gainers(days, gainers, display_names)))
 
-                # sending a section of the playtimes
-                await channel.send(embed_message(message))
+        # linked discord ids of the players with a
+        # tier, their members are fetched at once
+        tiered_ids = {}
+        for username, tier in leaderboard.tiered_players():
+            discord_id = self.bot.link_manager.get_discord_id(username)
+            if discord_id is not None:
+                tiered_ids[discord_id] = tier
 
-                # reset for the next section
-                message = ""
+        members = await self.bot.member_resolver.resolve_many(guild, tiered_ids)
+        for discord_id, tier in tiered_ids.items():
+            await self.attempt_role_assign(members.get(discord_id), tier, top_roles)
 
-        with open(PLAYERS_WITH_TOP_ROLES_PATH, "w") as write:
-            json.dump(self.temp_players_with_top_roles, write, indent=4)
+        await self.save_players_with_top_roles()
 
     @app_commands.command(
         name="playtime",
@@ -171,10 +240,9 @@ class PlaytimeCommands(commands.Cog):
                 return
 
         # retrieves the playtime from the Catastrophia API server
-        requested_url = CATASTROPHIA_API_URL + REQUEST_ENDPOINT
         try:
-            response = requests.get(requested_url, params={"username": username}, headers=API_KEY_HEADERS,
-                           timeout=5)
+            response = api_request("GET", REQUEST_ENDPOINT,
+                                   params={"username": username})
         except Exception as e:
             await error_message(self.bot, "Server offline", e)
             return
@@ -187,6 +255,8 @@ class PlaytimeCommands(commands.Cog):
             return
         else:
             playtime = response.json()
+            self.record_playtimes({username: playtime})
+            self.bot.username_index.add(username, replace=False)
 
         # formatting playtime and skipping playtimes, that are less than 1 hour
         if playtime < 60:
@@ -198,6 +268,90 @@ class PlaytimeCommands(commands.Cog):
         response_message = embed_message(message)
         await interaction.response.send_message(response_message)
 
+    @app_commands.command(
+        name="leaderboard",
+        description="Shows the top players, starting at the page of a set position."
+    )
+    async def leaderboard(
+            self,
+            interaction: discord.Interaction,
+            position: LeaderboardPosition = MIN_TOP_PLAYERS) -> None:
+        """Shows the pre-rendered leaderboard pages of
+        the latest snapshot, paged with buttons."""
+
+        pages = self.leaderboard_pages
+        if not pages:
+            await interaction.response.send_message(embed_message(
+                "The leaderboard has not been loaded yet."
+            ), ephemeral=True)
+            return
+
+        page = min((position - 1) // LEADERBOARD_PAGE_SIZE, len(pages) - 1)
+        await interaction.response.send_message(pages[page],
+                                                view=LeaderboardView(pages, page),
+                                                ephemeral=True)
+
+    @app_commands.command(
+        name="playtime_history",
+        description="Shows how the user's playtime grew over a time period."
+    )
+    @app_commands.choices(period=[
+        Choice(name="Last 7 days", value=7),
+        Choice(name="Last 30 days", value=30),
+        Choice(name="Last 90 days", value=90),
+        Choice(name="Last year", value=365)
+    ])
+    async def playtime_history(
+            self,
+            interaction: discord.Interaction,
+            username: str,
+            period: int = 7) -> None:
+        """Shows the recorded playtime of a player over the set amount of days."""
+
+        username = username.lower()
+
+        if username in CONFIDENTIAL_USERNAMES \
+                and not interaction.permissions.administrator:
+            print("Regular user tried to get confidential playtime history.")
+            return
+
+        since = int(time.time()) - period * 86400
+        samples = self.history.history(username, since)
+        if not samples:
+            await interaction.response.send_message(embed_message(
+                f"There is no recorded playtime for {username} "
+                f"in the last {period} days."
+            ), ephemeral=True)
+            return
+
+        # one line per step, showing the last sample of the step
+        step = max(1, -(-period // MAX_HISTORY_LINES)) * 86400
+        points = {}
+        for ts, playtime in samples:
+            points[(ts - since) // step] = (ts, playtime)
+
+        lines = [f"{username} gained {format_playtime(samples[-1][1] - samples[0][1])} "
+                 f"in the last {period} days."]
+        previous = samples[0][1]
+        for ts, playtime in points.values():
+            date = datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+            lines.append(f"{date}: {format_playtime(playtime)} "
+                         f"(+{playtime - previous} minutes)")
+            previous = playtime
+
+        await interaction.response.send_message(embed_message("\n".join(lines)))
+
+    @playtime.autocomplete("username")
+    @playtime_history.autocomplete("username")
+    async def username_autocomplete(self,
+                                    interaction: discord.Interaction,
+                                    current: str) -> list[Choice[str]]:
+        """Suggests known Roblox usernames, confidential ones only to administrators."""
+
+        exclude = () if interaction.permissions.administrator \
+            else CONFIDENTIAL_USERNAMES
+        return self.bot.username_index.choices(current, exclude=exclude)
+
     @app_commands.command(
         name="forceplaytime",
         description="Force sets a playtime to a Roblox username."
@@ -208,12 +362,11 @@ class PlaytimeCommands(commands.Cog):
                             new_playtime: int) -> None:
 
         # retrieves the playtime from the Catastrophia API server
-        requested_url = CATASTROPHIA_API_URL + REQUEST_ENDPOINT
         try:
-            response = requests.post(requested_url, params={"username": roblox_username,
-                                                            "playtime": new_playtime,
-                                                            "force_change": True}, headers=API_KEY_HEADERS,
-                                    timeout=5)
+            response = api_request("POST", REQUEST_ENDPOINT,
+                                   params={"username": roblox_username,
+                                           "playtime": new_playtime,
+                                           "force_change": True})
         except Exception as e:
             await error_message(self.bot, "Server offline", e)
             return
@@ -229,6 +382,14 @@ class PlaytimeCommands(commands.Cog):
             f"Force set playtime for {roblox_username} to {new_playtime}."
         ), ephemeral=True)
 
+    @forceplaytime.autocomplete("roblox_username")
+    async def forceplaytime_autocomplete(self,
+                                         _interaction: discord.Interaction,
+                                         current: str) -> list[Choice[str]]:
+        """Suggests known Roblox usernames."""
+
+        return self.bot.username_index.choices(current)
+
 
 async def setup(bot: CatastrophiaBot) -> None:
     """Cog setup."""
@@ -1,46 +1,58 @@
 import asyncio
 import math
 import time
+
 import discord
 import requests
 from discord import app_commands
+from discord.app_commands import Choice
+from discord.errors import HTTPException
 from discord.ext import commands, tasks
-from discord.utils import get
+
+from api_client import api_request
+from capabilities import Capabilities
 from discord_bot import CatastrophiaBot
+from lifecycle import stop_loop
+from link_state import LinkStateStore
 from methods import embed_message, error_message
-from discord.errors import HTTPException
-from settings import get_secret, get_config
+from metrics import LINK_PENDING_REQUESTS, LINK_POLL_DURATION, LINK_RESULTS
+from settings import get_config, get_secret
 
 GUILD_ID = get_secret("GUILD_ID")
 
+# users are fetched when they are needed, the guild is enough
+CAPABILITIES = Capabilities()
+
 # time configurations
 CONNECTION_TIMEOUT = get_config("LINK_CHECK_TIMEOUT")
 ATTEMPT_DELAY = get_config("LINK_CHECK_ATTEMPT_DELAY")
 BAN_DURATION = get_config("BAN_DURATION")
-UNBAN_CHECK_DELAY = get_config("UNBAN_CHECK_DELAY")
 
 # request constants
-CATASTROPHIA_API_URL = get_secret("CATASTROPHIA_API_URL")
-API_KEY_HEADERS = {"api-key": get_secret("API_KEY")}
 LINK_ENDPOINT = get_config("LINK_ENDPOINT")
 ALL_LINKS_ENDPOINT = get_config("ALL_LINKS_ENDPOINT")
 
 # command config
 CONFIDENTIAL_USERNAMES = get_config("CONFIDENTIAL_USERNAMES")
 
+# how many notification messages are sent at the same time
+NOTIFICATION_CONCURRENCY = get_config("NOTIFICATION_CONCURRENCY")
+
+# discord's message length limit
+MAX_MESSAGE_LENGTH = 2000
+
 
 def remove_link_from_server(roblox_username: str) -> None:
     """Sends a post request to the API server to remove a link request from its list.
     Status 2 means a terminated request, either a timeout or a completed request."""
 
     try:
-        requested_url = CATASTROPHIA_API_URL + LINK_ENDPOINT
-        requests.post(requested_url,
-                      params={
-                          "roblox_username": roblox_username,
-                          "status": 2
-                      },
-                      headers=API_KEY_HEADERS)
+        api_request("POST", LINK_ENDPOINT,
+                    params={
+                        "roblox_username": roblox_username,
+                        "status": 2
+                    },
+                    timeout=None)
     except requests.exceptions.RequestException:
         return
 
@@ -52,133 +64,258 @@ class RobloxConnect(commands.Cog):
     def __init__(self, bot: CatastrophiaBot) -> None:
         self.bot = bot
 
-        # made linking requests to check for by the bot
-        self.pending_requests = {}
+        # made linking requests and linking bans,
+        # restored from the previous run in cog_load
+        self.link_state: LinkStateStore | None = None
+        self.pending_requests: dict[str, dict] = {}
+        self.pending_by_user: dict[int, str] = {}
+        self.users_banned_from_linking: dict[int, float] = {}
+
+        # channel id -> notifications waiting to be sent at the end of the current cycle
+        self.outbox: dict[int, list[str]] = {}
 
-        self.users_banned_from_linking = []
+        # prevents a slow link check from overlapping with the next one
+        self.check_lock = asyncio.Lock()
+
+        # requests and linking bans expire exactly on time through the scheduler
+        bot.scheduler.register("link_request_expire", self.expire_link_request)
+        bot.scheduler.register("link_unban", self.expire_link_ban)
+
+        # a running link check is finished and its
+        # notifications sent before shutting down
+        bot.shutdown_manager.register(
+            "stop", "link checks",
+            lambda: stop_loop(self.check_link_requests, self.check_lock)
+        )
+        bot.shutdown_manager.register("drain", "link notifications",
+                                      self.flush_notifications)
+        bot.shutdown_manager.register("flush", "link state", self.save_link_state)
+
+    async def cog_load(self) -> None:
+        """Restores the linking state without blocking the
+        other cogs and starts checking the requests."""
+
+        self.link_state = await asyncio.to_thread(LinkStateStore)
+        self.pending_requests = self.link_state.pending_requests
+        self.pending_by_user = self.link_state.pending_by_user
+        self.users_banned_from_linking = self.link_state.linking_bans
 
-        self.check_unbans.start()
         self.check_link_requests.start()
 
-    @tasks.loop(hours=12)
-    async def check_unbans(self):
-        """Checks all users that are banned from making linking requests if their ban has not expired yet."""
+    async def save_link_state(self) -> None:
+        if self.link_state is not None:
+            self.link_state.save_file()
+
+    def add_request(self,
+                    roblox_username: str,
+                    user: discord.User,
+                    channel: discord.abc.Messageable) -> None:
+        """Saves a client side linking request and schedules its expiration."""
+
+        new_link_request = self.link_state.add_request(roblox_username, user.id,
+                                                       channel.id)
+
+        key = roblox_username.lower()
+        start_time = new_link_request["start_time"]
+        self.bot.scheduler.schedule(f"link_request:{key}", "link_request_expire",
+                                    {"roblox_username": key, "start_time": start_time},
+                                    start_time + CONNECTION_TIMEOUT)
 
-        if not self.bot.is_ready():
+    def drop_request(self, roblox_username: str) -> None:
+        """Removes a client side request and its scheduled expiration."""
+
+        key = roblox_username.lower()
+        self.link_state.remove_request(key)
+        self.bot.scheduler.cancel(f"link_request:{key}")
+
+    async def resolve_user(self, local_request: dict) -> discord.User:
+        """Gets the user of a request, from the cache if possible.
+        Raises discord.HTTPException if the fetch fails."""
+
+        user = self.bot.get_user(local_request["discord_user_id"])
+        if user is None:
+            user = await self.bot.fetch_user(local_request["discord_user_id"])
+        return user
+
+    def queue_notification(self, channel_id: int, message: str) -> None:
+        """Queues a message to be sent together with
+        the other notifications of the channel."""
+
+        self.outbox.setdefault(channel_id, []).append(message)
+
+    async def flush_notifications(self) -> None:
+        """Sends all queued notifications, merged into as few messages as possible
+        per channel and with a limited amount of channels at the same time."""
+
+        if not self.outbox:
             return
 
-        to_unban = []
+        outbox, self.outbox = self.outbox, {}
+        semaphore = asyncio.Semaphore(NOTIFICATION_CONCURRENCY)
 
-        for unban_attempt in self.users_banned_from_linking:
-            been_banned_for = unban_attempt["expiration_date"] - time.time()
-            if been_banned_for <= 0:
-                to_unban.append(unban_attempt)
+        async def send_to_channel(channel_id: int, messages: list[str]) -> None:
+            # merging the notifications into messages within the length limit
+            merged_messages = [messages[0]]
+            for message in messages[1:]:
+                if len(merged_messages[-1]) + len(message) + 1 > MAX_MESSAGE_LENGTH:
+                    merged_messages.append(message)
+                else:
+                    merged_messages[-1] += "\n" + message
+
+            async with semaphore:
+                try:
+                    channel = self.bot.get_channel(channel_id)
+                    if channel is None:
+                        channel = await self.bot.fetch_channel(channel_id)
+
+                    for merged_message in merged_messages:
+                        await channel.send(merged_message)
+                except discord.HTTPException as exception:
+                    print(f"RobloxConnect - failed to notify channel "
+                          f"{channel_id}: {exception}")
+
+        await asyncio.gather(*(send_to_channel(channel_id, messages)
+                               for channel_id, messages in outbox.items()))
+
+    async def expire_link_request(self, payload: dict) -> None:
+        """Removes a request that exceeded the allowed
+        age and informs the user who initiated it."""
+
+        local_request = self.pending_requests.get(payload["roblox_username"])
+
+        # the request was already resolved or replaced by a newer one
+        if local_request is None \
+                or local_request["start_time"] != payload["start_time"]:
+            return
 
-        for unban in to_unban:
-            self.users_banned_from_linking.remove(unban)
+        self.link_state.remove_request(payload["roblox_username"])
+        LINK_RESULTS.inc(("expired",))
+
+        # informing the discord user who initiated
+        # the request, sent with the next link check
+        user = await self.resolve_user(local_request)
+        self.queue_notification(
+            local_request["channel_id"],
+            embed_message(
+                f"The request to link the username "
+                f"{local_request['roblox_username']} to {user.display_name} "
+                f"has expired."))
+
+    async def expire_link_ban(self, payload: dict) -> None:
+        """Allows a user to make linking requests again after the ban has expired."""
+
+        self.link_state.remove_ban(payload["user_id"])
 
     @tasks.loop(seconds=10)
     async def check_link_requests(self):
-        """Asks the API server for its recorded requests, compares them to the client side requests
-        and performs operations for each request depending on its status and their age."""
+        """Processes the linking requests and sends the
+        notifications collected during the cycle."""
 
-        if not self.bot.is_ready():
+        if not self.bot.is_ready() or self.check_lock.locked():
             return
 
+        async with self.check_lock:
+            start = time.perf_counter()
+            await self.process_link_requests()
+            await self.flush_notifications()
+
+            LINK_POLL_DURATION.observe(time.perf_counter() - start)
+            LINK_PENDING_REQUESTS.set(len(self.pending_requests))
+
+    async def process_link_requests(self):
+        """Asks the API server for its recorded requests, compares
+        them to the client side requests and performs operations
+        for each request depending on its status and their age."""
+
         # attempts to get the API server requests
-        requested_url = CATASTROPHIA_API_URL + ALL_LINKS_ENDPOINT
         try:
-            response = requests.get(requested_url, headers=API_KEY_HEADERS, timeout=5)
-        except Exception as e:
+            response = api_request("GET", ALL_LINKS_ENDPOINT)
+        except Exception:
             # await error_message(self.bot, "ALL LINK GET REQUEST", e)
             return
 
         # checks for invalid requests
         try:
             response.raise_for_status()
-        except Exception as exception:
-            print(f"Check - Incorrect request")
+        except Exception:
+            print("Check - Incorrect request")
             # await error_message(self.bot, "ALL LINK response.raise_for_status()", exception, response.content)
             return
         else:
             server_link_requests = response.json()
 
-        to_remove_usernames = []
-
-        # server clean up and confirmations
-        for roblox_username in self.pending_requests:
-            # gets the client side request for the set roblox username
-            local_request: dict = self.pending_requests[roblox_username]
-            age = time.time() - local_request["start_time"]
-            user: discord.User = local_request["discord_user"]
-            channel: discord.Interaction.channel = local_request[
-                "request_channel"]
-
-            # checks for requests that exceeded the allowed age and removes them
-            if age > CONNECTION_TIMEOUT:
-                # informing the discord user who initiated the request
-                await channel.send(
-                    # f"{user.mention}" + "\n" +
-                    embed_message(
-                        f"The request to link the username {roblox_username} to {user.display_name} "
-                        f"has expired."))
-
-                # removing it from the client side request list
-                to_remove_usernames.append(roblox_username)
-
-        for to_remove_username in to_remove_usernames:
-            del self.pending_requests[to_remove_username]
-
         # checks for every request from the API server and performs the required operations based on their status
         for roblox_username in server_link_requests:
             outdated = False
+            local_request = self.pending_requests.get(roblox_username.lower())
 
             # request exceeded allowed time and has already been cancelled on the bot side
-            if roblox_username not in self.pending_requests:
+            if local_request is None:
                 outdated = True
 
             # links the discord account to the roblox username if the status is 1
             else:
                 status = server_link_requests[roblox_username]["status"]
 
-                local_request: dict = self.pending_requests[roblox_username]
-                user: discord.User = local_request["discord_user"]
-                channel: discord.Interaction.channel = local_request[
-                    "request_channel"]
-
                 if status == 1 or status == 3 or status == 4:
+                    # the user is only needed when there is something to send
+                    try:
+                        user = await self.resolve_user(local_request)
+                    except discord.NotFound:
+                        # the discord account was deleted, the request is dropped
+                        print(f"RobloxConnect - dropping the request of "
+                              f"{roblox_username}, the user does not exist")
+                        self.drop_request(roblox_username)
+                        remove_link_from_server(roblox_username)
+                        continue
+                    except discord.HTTPException as exception:
+                        # the request is handled again during the next check
+                        print(f"RobloxConnect - failed to fetch the user of "
+                              f"{roblox_username}: {exception}")
+                        continue
+
+                    channel_id = local_request["channel_id"]
+
+                    result = {1: "linked", 3: "denied", 4: "not_allowed"}[status]
+                    LINK_RESULTS.inc((result,))
+
                     if status == 1:
                         # save linking status
                         self.bot.link_manager.add_user(roblox_username, user.id)
+                        self.bot.username_index.add(roblox_username)
 
                         # informs the user of the successful linking
-                        await channel.send(
+                        self.queue_notification(
+                            channel_id,
                             f"{user.mention}" + "\n" + embed_message(
                                 f"Username linking between '{user.name}' and '{roblox_username}' was successful."
                             ))
                     elif status == 3:
                         # request was denied, bans the user from making other requests to prevent spam
-                        new_ban = {
-                            "discord_user": user,
-                            "expiration_date": time.time() + BAN_DURATION
-                        }
-                        self.users_banned_from_linking.append(new_ban)
+                        expiration_date = time.time() + BAN_DURATION
+                        self.link_state.add_ban(user.id, expiration_date)
+                        self.bot.scheduler.schedule(f"link_unban:{user.id}",
+                                                    "link_unban",
+                                                    {"user_id": user.id},
+                                                    expiration_date)
 
                         # informing the user
-                        await channel.send(
+                        self.queue_notification(
+                            channel_id,
                             f"{user.mention}" + "\n" + embed_message(
                                 f"Your linking request has been denied, you will not be able to initiate "
                                 f"any linking request for {BAN_DURATION // 3600} hours."
                             ))
                     elif status == 4:
                         # the roblox account is below 13 years of age, doesn't allow showing discord
-                        await channel.send(
+                        self.queue_notification(
+                            channel_id,
                             f"{user.mention}" + "\n" + embed_message(
-                                f"This roblox account does not allow username linking."
+                                "This roblox account does not allow username linking."
                             ))
 
-                    # getting rid of the client side request as well
-                    del self.pending_requests[roblox_username]
+                    # getting rid of the client side request and its expiration as well
+                    self.drop_request(roblox_username)
                     outdated = True
 
             # sending a request to remove the linking request from the API server list
@@ -217,57 +354,54 @@ class RobloxConnect(commands.Cog):
         # disallows linking when already linked
         if self.bot.link_manager.is_discord_id_linked(interaction.user.id):
             await interaction.response.send_message(
-                embed_message(f"You are already linked to a Roblox username."))
+                embed_message("You are already linked to a Roblox username."))
             return
 
         # checks if there is an active request from the user
-        for local_roblox_username in self.pending_requests:
-            local_request: dict = self.pending_requests[local_roblox_username]
-            if local_request["discord_user"] == interaction.user:
-                await interaction.response.send_message(
-                    embed_message(
-                        f"You have already issued a linking request. "
-                        f"If you misspelled the Roblox username, please wait "
-                        f"{round(CONNECTION_TIMEOUT - (time.time() - local_request['start_time']))} "
-                        f"seconds for the request to expire."))
-                return
+        pending_username = self.pending_by_user.get(interaction.user.id)
+        if pending_username is not None:
+            local_request: dict = self.pending_requests[pending_username]
+            remaining = CONNECTION_TIMEOUT - (time.time() - local_request["start_time"])
+            await interaction.response.send_message(
+                embed_message(
+                    f"You have already issued a linking request. "
+                    f"If you misspelled the Roblox username, please wait "
+                    f"{round(remaining)} seconds for the request to expire."))
+            return
 
         # checks if the user isn't banned from linking requests
-        for banned_user_dict in self.users_banned_from_linking:
-            if banned_user_dict["discord_user"] == interaction.user:
-                # counting remaining banned time
-                banned_till_in_seconds = banned_user_dict[
-                    "expiration_date"] - time.time()
-                if banned_till_in_seconds >= 3600:
-                    banned_till = f"{math.ceil(banned_till_in_seconds / 3600)} hours"
-                else:
-                    banned_till = f"{math.ceil(banned_till_in_seconds / 60)} minutes"
+        expiration_date = self.users_banned_from_linking.get(interaction.user.id)
+        if expiration_date is not None and expiration_date > time.time():
+            # counting remaining banned time
+            banned_till_in_seconds = expiration_date - time.time()
+            if banned_till_in_seconds >= 3600:
+                banned_till = f"{math.ceil(banned_till_in_seconds / 3600)} hours"
+            else:
+                banned_till = f"{math.ceil(banned_till_in_seconds / 60)} minutes"
 
-                # response
-                await interaction.response.send_message(
-                    embed_message(
-                        f"You are banned from making linking requests for another {banned_till}."
-                    ))
-                return
+            # response
+            await interaction.response.send_message(
+                embed_message(
+                    f"You are banned from making linking requests "
+                    f"for another {banned_till}."
+                ))
+            return
 
         # disallows users to link to admin accounts
         if roblox_username.lower() in CONFIDENTIAL_USERNAMES:
             await interaction.response.send_message(
                 embed_message(
-                    f"You can not make a link request to this username."))
+                    "You can not make a link request to this username."))
             return
 
         # initiating the request on the API server
         try:
-            requested_url = CATASTROPHIA_API_URL + LINK_ENDPOINT
-            response = requests.post(requested_url,
-                                     params={
-                                         "roblox_username": roblox_username,
-                                         "discord_name": interaction.user.name,
-                                         "status": 0
-                                     },
-                                     headers=API_KEY_HEADERS,
-                                     timeout=5)
+            response = api_request("POST", LINK_ENDPOINT,
+                                   params={
+                                       "roblox_username": roblox_username,
+                                       "discord_name": interaction.user.name,
+                                       "status": 0
+                                   })
         except requests.exceptions.RequestException as e:
             await error_message(self.bot, "Server offline", e)
             return
@@ -283,12 +417,7 @@ class RobloxConnect(commands.Cog):
             return
 
         # creating the link request to save for the client side (the discord bot in this case)
-        new_link_request = {
-            "discord_user": interaction.user,
-            "request_channel": interaction.channel,
-            "start_time": time.time()
-        }
-        self.pending_requests[roblox_username] = new_link_request
+        self.add_request(roblox_username, interaction.user, interaction.channel)
 
         # confirmation response
         await interaction.response.send_message(
@@ -312,7 +441,7 @@ class RobloxConnect(commands.Cog):
         if not self.bot.link_manager.is_discord_id_linked(user.id):
             # user isn't linked, but only linked roles have access to the command anyway
             await interaction.response.send_message(
-                embed_message(f"You are not linked to any username."))
+                embed_message("You are not linked to any username."))
             return
         else:
             self.bot.link_manager.remove_user(user.id)
@@ -324,7 +453,8 @@ class RobloxConnect(commands.Cog):
                 # unlink response, for some reason throws a rate limited error
                 await interaction.response.send_message(
                     embed_message(
-                        f"Your Discord account has been unlinked from the Roblox username."
+                        "Your Discord account has been unlinked "
+                        "from the Roblox username."
                     ))
             except HTTPException:
                 print("RemoveLink - TOO MANY REQUESTS")
@@ -339,10 +469,23 @@ class RobloxConnect(commands.Cog):
                         roblox_username: str) -> None:
 
         self.bot.link_manager.add_user(roblox_username, user.id)
+        self.bot.username_index.add(roblox_username)
         await interaction.response.send_message(embed_message(
             f"Linked {user.name} to {roblox_username}."
         ), ephemeral=True)
 
+    @link.autocomplete("roblox_username")
+    @forcelink.autocomplete("roblox_username")
+    async def roblox_username_autocomplete(self,
+                                           interaction: discord.Interaction,
+                                           current: str) -> list[Choice[str]]:
+        """Suggests known Roblox usernames, confidential ones only to administrators."""
+
+        exclude = () if interaction.permissions.administrator \
+            else CONFIDENTIAL_USERNAMES
+        return self.bot.username_index.choices(current, exclude=exclude)
+
+
 async def setup(bot: CatastrophiaBot) -> None:
     """Cog setup."""
 
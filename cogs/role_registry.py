@@ -0,0 +1,134 @@
+import discord
+from discord.ext import commands
+from discord.utils import get
+
+from capabilities import Capabilities
+from discord_bot import CatastrophiaBot
+from settings import get_config, get_secret
+
+GUILD_ID = get_secret("GUILD_ID")
+
+# role events are part of the guilds intent
+CAPABILITIES = Capabilities()
+
+TOP_ROLE_TIERS = get_config("TOP_ROLE_TIERS")
+
+# roles without a configured id are looked up by their name once
+MUTED_ROLE_ID = get_config("MUTED_ROLE_ID")
+LINKED_ROLE_ID = get_config("LINKED_ROLE_ID")
+MUTED_ROLE_NAME = "muted"
+LINKED_ROLE_NAME = "Linked"
+
+
+class RoleRegistry(commands.Cog):
+    """Cog resolving the configured roles of the server
+    once and keeping them updated from role events."""
+
+    def __init__(self, bot: CatastrophiaBot) -> None:
+        self.bot = bot
+
+        self.tier_roles: list[discord.Role | None] = [None] * len(TOP_ROLE_TIERS)
+        self.muted_role: discord.Role | None = None
+        self.linked_role: discord.Role | None = None
+
+        # role id -> name of the attribute or index of the tier holding the role
+        self.slots: dict[int, str | int] = {}
+
+        self.resolved = False
+
+    def resolve(self) -> None:
+        """Looks up all configured roles in the guild."""
+
+        guild = self.bot.get_guild(GUILD_ID)
+        if guild is None:
+            # the guild is not cached yet, resolving again on the next access
+            return
+
+        self.slots = {}
+        for tier, tier_config in enumerate(TOP_ROLE_TIERS):
+            self.tier_roles[tier] = guild.get_role(tier_config["role_id"])
+            self.slots[tier_config["role_id"]] = tier
+
+        self.muted_role = self.resolve_role(guild, MUTED_ROLE_ID, MUTED_ROLE_NAME)
+        self.linked_role = self.resolve_role(guild, LINKED_ROLE_ID, LINKED_ROLE_NAME)
+        for attribute in ("muted_role", "linked_role"):
+            role = getattr(self, attribute)
+            if role is not None:
+                self.slots[role.id] = attribute
+
+        tiers = zip(TOP_ROLE_TIERS, self.tier_roles, strict=True)
+        missing = [str(tier_config["role_id"])
+                   for tier_config, role in tiers if role is None]
+        if missing:
+            print(f"RoleRegistry - missing tier roles: {', '.join(missing)}")
+
+        self.resolved = True
+
+    @staticmethod
+    def resolve_role(guild: discord.Guild,
+                     role_id: int | None,
+                     role_name: str) -> discord.Role | None:
+        if role_id is not None:
+            return guild.get_role(role_id)
+        return get(guild.roles, name=role_name)
+
+    def set_slot(self, slot: str | int, role: discord.Role | None) -> None:
+        if isinstance(slot, int):
+            self.tier_roles[slot] = role
+        else:
+            setattr(self, slot, role)
+
+    def get_tier_roles(self) -> list[discord.Role | None]:
+        """Returns the top roles ordered from the highest tier."""
+
+        if not self.resolved:
+            self.resolve()
+        return self.tier_roles
+
+    def get_muted_role(self) -> discord.Role | None:
+        if not self.resolved:
+            self.resolve()
+        return self.muted_role
+
+    def get_linked_role(self) -> discord.Role | None:
+        if not self.resolved:
+            self.resolve()
+        return self.linked_role
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Resolves the roles once the guild is cached."""
+
+        self.resolve()
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, _):
+        """A role looked up by its name might have been recreated."""
+
+        self.resolve()
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, _, after: discord.Role):
+        """Keeps the role objects current."""
+
+        slot = self.slots.get(after.id)
+        if slot is not None:
+            self.set_slot(slot, after)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        """Forgets deleted roles."""
+
+        slot = self.slots.pop(role.id, None)
+        if slot is not None:
+            self.set_slot(slot, None)
+            print(f"RoleRegistry - the role '{role.name}' has been deleted.")
+
+
+async def setup(bot: CatastrophiaBot) -> None:
+    """Cog setup."""
+
+    await bot.add_cog(
+        RoleRegistry(bot),
+        guilds=[discord.Object(id=GUILD_ID)]
+    )
@@ -0,0 +1,36 @@
+import hashlib
+import json
+import os
+
+import discord
+from discord import app_commands
+
+from settings import get_config, package_path
+
+COMMAND_TREE_HASH_PATH = package_path(get_config("COMMAND_TREE_HASH_PATH"))
+
+
+def command_tree_hash(tree: app_commands.CommandTree,
+                      guild: discord.abc.Snowflake) -> str:
+    """Hashes the serialized commands of the guild, the
+    hash only changes when the synced payload would."""
+
+    payload = sorted((command.to_dict() for command in tree.get_commands(guild=guild)),
+                     key=lambda command: command["name"])
+    serialized = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def load_synced_hash() -> str | None:
+    """Returns the hash of the last synced command tree."""
+
+    if not os.path.exists(COMMAND_TREE_HASH_PATH):
+        return None
+
+    with open(COMMAND_TREE_HASH_PATH, "r") as read:
+        return read.read().strip()
+
+
+def save_synced_hash(tree_hash: str) -> None:
+    with open(COMMAND_TREE_HASH_PATH, "w") as write:
+        write.write(tree_hash)
@@ -1,47 +1,196 @@
+import asyncio
 import os
+import time
+
 import discord
 from discord.ext import commands
-from settings import get_secret
+
+from capabilities import combine_capabilities
+from command_sync import command_tree_hash, load_synced_hash, save_synced_hash
+from lifecycle import ShutdownManager
 from link_manager import LinkManager
+from member_resolver import MemberResolver
+from metrics import COMMAND_DURATION, COMMAND_ERRORS
+from sanction_scheduler import SanctionScheduler
+from settings import PACKAGE_DIR, get_config, get_secret
+from startup_timer import StartupTimer
+from username_index import UsernameIndex
 
 BOT_TOKEN = get_secret("BOT_TOKEN")
 APPLICATION_ID = get_secret("APPLICATION_ID")
 GUILD_ID = get_secret("GUILD_ID")
 
+# requests only the intents and caches declared by
+# the cogs, disabled to compare with all intents
+DECLARED_INTENTS_ONLY = get_config("DECLARED_INTENTS_ONLY")
+
+# the shutdown hooks have this long to finish, in seconds, before the bot closes anyway
+SHUTDOWN_DEADLINE = get_config("SHUTDOWN_DEADLINE")
+
+# cogs are looked up next to this file, independent of the working directory
+COGS_PACKAGE = "cogs"
+COGS_PATH = os.path.join(PACKAGE_DIR, COGS_PACKAGE)
+
+
+def cog_modules() -> list[str]:
+    """Returns the module names of all cogs."""
+
+    return [f"{COGS_PACKAGE}.{path.replace('.py', '')}"
+            for path in sorted(os.listdir(COGS_PATH))
+            if path.endswith(".py")]
+
+
+def command_duration(interaction: discord.Interaction) -> float:
+    return (discord.utils.utcnow() - interaction.created_at).total_seconds()
+
 
 class CatastrophiaBot(commands.Bot):
     """Main bot class for CatastrophiaBot"""
 
-    def __init__(self):
+    def __init__(self, force_sync: bool = False):
+        self.startup_timer = StartupTimer()
+
+        # syncs the command tree even if it has not changed since the last sync
+        self.force_sync = force_sync
+
+        with self.startup_timer.phase("intents"):
+            if DECLARED_INTENTS_ONLY:
+                capabilities = combine_capabilities(cog_modules())
+            else:
+                capabilities = discord.Intents.all(), None, 1000
+            intents, member_cache_flags, max_messages = capabilities
+
         # bot settings
         super().__init__(
             command_prefix="-",
-            intents=discord.Intents.all(),
+            intents=intents,
+            member_cache_flags=member_cache_flags,
+            max_messages=max_messages,
+            # members are fetched on demand by the member resolver,
+            # the member list is not downloaded on startup
+            chunk_guilds_at_startup=False,
             application_id=APPLICATION_ID
         )
 
+        with self.startup_timer.phase("state"):
+            self.link_manager = LinkManager()
+
+            # known roblox usernames for autocomplete,
+            # cogs add the usernames they come across
+            self.username_index = UsernameIndex(self.link_manager.temp_dict.values())
 
-        self.link_manager = LinkManager()
+            # members missing from the member cache are fetched on demand
+            self.member_resolver = MemberResolver()
 
-        # bot start
-        self.run(BOT_TOKEN)
+            # timed bans, mutes and linking bans
+            self.scheduler = SanctionScheduler()
+
+        # cogs register the hooks that drain and flush their state on shutdown
+        self.shutdown_manager = ShutdownManager()
+        self.shutdown_task: asyncio.Task | None = None
+        self.shutdown_manager.register("stop", "scheduler", self.scheduler.stop)
+        self.shutdown_manager.register("flush", "link manager", self.flush_links)
+
+        # failed commands are counted before the tree's own handler logs them
+        self.log_app_command_error = self.tree.on_error
+        self.tree.on_error = self.on_app_command_error
 
     async def setup_hook(self):
         """Performs setup operations necessary before bot start."""
 
-        # formatting and loading all cogs
-        for path in os.listdir("cogs"):
-            if ".py" not in path:
-                continue
+        # the cogs do not depend on each other, their
+        # blocking setup runs in threads during cog_load
+        cog_load_times: dict[str, float] = {}
+        with self.startup_timer.phase("cogs"):
+            await asyncio.gather(*(self.load_cog(cog_path, cog_load_times)
+                                   for cog_path in cog_modules()))
+
+        print("Cog load times (overlapping):\n" + "\n".join(
+            f"{cog_path:<32}{duration * 1000:>8.0f} ms"
+            for cog_path, duration in sorted(cog_load_times.items(),
+                                             key=lambda item: item[1], reverse=True)
+        ))
+
+        # cogs have registered their expiry handlers by now
+        self.scheduler.start(self)
 
-            cog_name = path.replace(".py", "")
-            cog_path = f"cogs.{cog_name}"
-            await self.load_extension(cog_path)
+        with self.startup_timer.phase("command sync"):
+            await self.sync_commands()
 
-        await self.tree.sync(guild=discord.Object(id=GUILD_ID))
-        print(f"Setup hook finished.")
+        print("Setup hook finished.")
+
+    async def load_cog(self, cog_path: str, load_times: dict[str, float]) -> None:
+        """Loads a single cog and measures how long it took."""
+
+        start = time.perf_counter()
+        await self.load_extension(cog_path)
+        load_times[cog_path] = time.perf_counter() - start
+
+    async def sync_commands(self) -> None:
+        """Syncs the command tree only when it changed
+        since the last sync, syncing is rate limited."""
+
+        guild = discord.Object(id=GUILD_ID)
+        tree_hash = command_tree_hash(self.tree, guild)
+
+        if not self.force_sync and tree_hash == load_synced_hash():
+            print("Command tree unchanged, skipping the sync.")
+            return
+
+        await self.tree.sync(guild=guild)
+        save_synced_hash(tree_hash)
+        print("Command tree synced.")
+
+    async def flush_links(self) -> None:
+        self.link_manager.save_file()
+
+    def request_shutdown(self) -> None:
+        """Starts the shutdown, called from the signal handlers."""
+
+        if self.shutdown_task is None:
+            self.shutdown_task = asyncio.create_task(self.shutdown())
+
+    async def shutdown(self) -> None:
+        """Runs the shutdown hooks and closes the
+        connection to discord, which unloads the cogs."""
+
+        print("Shutting down.")
+        await self.shutdown_manager.run(SHUTDOWN_DEADLINE)
+        await self.close()
+
+    async def on_app_command_completion(self,
+                                        interaction: discord.Interaction,
+                                        command) -> None:
+        """Records how long the command took since the interaction was created."""
+
+        COMMAND_DURATION.observe(command_duration(interaction),
+                                 (command.qualified_name,))
+
+    async def on_app_command_error(self, interaction: discord.Interaction,
+                                   error: discord.app_commands.AppCommandError) -> None:
+        """Counts the failed commands, the default handler logs
+        the traceback unless the command handles its errors."""
+
+        command = interaction.command
+        name = command.qualified_name if command is not None else "unknown"
+        COMMAND_ERRORS.inc((name,))
+        COMMAND_DURATION.observe(command_duration(interaction), (name,))
+        await self.log_app_command_error(interaction, error)
+
+    @property
+    def role_registry(self):
+        """The cog holding the resolved roles of the server."""
+
+        return self.get_cog("RoleRegistry")
 
     async def on_ready(self):
         """Bot is ready."""
 
         print(f"{self.user} bot is ready.")
+
+        # on_ready is dispatched again after reconnecting
+        if "connecting" not in self.startup_timer.phases:
+            # the rest of the startup is spent logging in and receiving the guilds
+            phases = self.startup_timer.phases
+            phases["connecting"] = self.startup_timer.elapsed() - sum(phases.values())
+            print(f"Startup times:\n{self.startup_timer.report()}")
@@ -0,0 +1,185 @@
+import asyncio
+
+import discord
+from discord.ext import tasks
+
+from lifecycle import stop_loop
+from message_cleaner import delete_messages
+from settings import get_config
+
+ENFORCEMENT_WINDOW = get_config("ENFORCEMENT_WINDOW")
+
+# keeps the digest embed within discord's field and size limits
+MAX_DIGEST_USERS = 20
+MAX_EXCERPT_LENGTH = 150
+
+# the strongest punishment of a user in a window is the one that gets applied
+PUNISHMENT_SEVERITY = {
+    "warn": 0,
+    "mute": 1,
+    "ban": 2
+}
+
+
+def create_crime_digest(channel_id: int, verdicts: list[dict]) -> discord.Embed:
+    """Creates a discord Embed summarizing all messages
+    that were moderated in a channel during one window."""
+
+    # groups the verdicts by the offending users
+    verdicts_by_user: dict[int, list[dict]] = {}
+    for verdict in verdicts:
+        verdicts_by_user.setdefault(verdict["message"].author.id, []).append(verdict)
+
+    # initiating the embed
+    embed = discord.Embed(title="Thought crime detected",
+                          description=f"Removed {len(verdicts)} message(s) "
+                                      f"from {len(verdicts_by_user)} user(s) "
+                                      f"in <#{channel_id}>.\n**Reason:** oldspeak",
+                          color=0xff0000)
+
+    # big brother thumbnail
+    embed.set_thumbnail(
+        url="https://caquiscaidosblog.files.wordpress.com/2009/01/1984-movie-bb2_a.jpg")
+
+    # one field for every offending user
+    for user_id, user_verdicts in list(verdicts_by_user.items())[:MAX_DIGEST_USERS]:
+        first_verdict = user_verdicts[0]
+        offensive_word = first_verdict["offensive_word"]
+
+        # highlights the offensive word in a shortened message
+        excerpt = first_verdict["message"].content[:MAX_EXCERPT_LENGTH]
+        excerpt = excerpt.replace(offensive_word, f"**{offensive_word}**")
+
+        crime_types = ", ".join(sorted({verdict["crime_type"]
+                                        for verdict in user_verdicts}))
+        value = f"<@{user_id}> - {crime_types}\n{excerpt}"
+        if len(user_verdicts) > 1:
+            value += f"\n(+{len(user_verdicts) - 1} more message(s))"
+
+        embed.add_field(name=first_verdict["message"].author.display_name,
+                        value=value, inline=False)
+
+    if len(verdicts_by_user) > MAX_DIGEST_USERS:
+        hidden_users = len(verdicts_by_user) - MAX_DIGEST_USERS
+        embed.add_field(name="...", value=f"and {hidden_users} more user(s)",
+                        inline=False)
+
+    # footer for design purposes
+    embed.set_footer(text="CatastrophiaBot")
+
+    return embed
+
+
+class EnforcementQueue:
+    """Collects moderation verdicts and enforces them in batches once every window, so a
+    raid does not turn every offensive message into several separate discord calls."""
+
+    def __init__(self, bot) -> None:
+        self.bot = bot
+
+        # verdicts waiting for the next window, grouped by the channel id
+        self.pending: dict[int, dict[int, dict]] = {}
+
+        # held while a window is enforced
+        self.enforce_lock = asyncio.Lock()
+
+        self.enforce_pending.start()
+
+    def submit(self,
+               message: discord.Message,
+               crime_type: str,
+               punishment: str,
+               offensive_word: str) -> None:
+        """Queues a verdict for the message, a message that is
+        submitted twice (e.g. after an edit) is enforced only once."""
+
+        self.pending.setdefault(message.channel.id, {})[message.id] = {
+            "message": message,
+            "crime_type": crime_type,
+            "punishment": punishment,
+            "offensive_word": offensive_word
+        }
+
+    def stop(self) -> None:
+        """Stops enforcing queued verdicts."""
+
+        self.enforce_pending.cancel()
+
+    async def drain(self) -> None:
+        """Finishes the running window, stops the loop and
+        enforces the verdicts that are still queued."""
+
+        await stop_loop(self.enforce_pending, self.enforce_lock)
+        async with self.enforce_lock:
+            await self.enforce()
+
+    @tasks.loop(seconds=ENFORCEMENT_WINDOW)
+    async def enforce_pending(self):
+        """Enforces the verdicts of the window while holding the lock."""
+
+        async with self.enforce_lock:
+            await self.enforce()
+
+    async def enforce(self):
+        """Removes the queued messages, sends a single
+        report per channel and punishes every user once."""
+
+        if not self.pending:
+            return
+
+        # swapping the queue, verdicts submitted during
+        # the enforcement belong to the next window
+        pending, self.pending = self.pending, {}
+
+        # the strongest verdict of every user in this window
+        user_verdicts: dict[int, dict] = {}
+
+        for channel_id, verdicts_by_message in pending.items():
+            verdicts = list(verdicts_by_message.values())
+            channel = verdicts[0]["message"].channel
+
+            try:
+                await delete_messages(channel,
+                                      [verdict["message"] for verdict in verdicts],
+                                      reason="oldspeak")
+                await channel.send(embed=create_crime_digest(channel_id, verdicts))
+            except discord.HTTPException as exception:
+                # missing permissions or a deleted channel, the users are still punished
+                print(f"Enforcement - failed to clean up channel "
+                      f"{channel_id}: {exception}")
+
+            for verdict in verdicts:
+                user_id = verdict["message"].author.id
+                strongest = user_verdicts.get(user_id)
+                if strongest is None or \
+                        PUNISHMENT_SEVERITY[verdict["punishment"]] \
+                        > PUNISHMENT_SEVERITY[strongest["punishment"]]:
+                    user_verdicts[user_id] = verdict
+
+        for verdict in user_verdicts.values():
+            await self.punish(verdict)
+
+    async def punish(self, verdict: dict) -> None:
+        """Applies the configured punishment to the author of the message."""
+
+        message: discord.Message = verdict["message"]
+        member = message.author
+        guild = message.guild
+        reason = f"ThoughtPolice: {verdict['crime_type']}"
+
+        try:
+            if verdict["punishment"] == "ban":
+                await guild.ban(member, delete_message_seconds=0, reason=reason)
+            elif verdict["punishment"] == "mute":
+                role = self.bot.role_registry.get_muted_role()
+                if role is not None and isinstance(member, discord.Member) \
+                        and member.get_role(role.id) is None:
+                    await member.add_roles(role, reason=reason)
+            elif verdict["punishment"] == "warn":
+                await member.send(
+                    f"Your message in #{message.channel.name} was removed "
+                    f"for {verdict['crime_type']}. Further offences will be punished.")
+        except discord.HTTPException as exception:
+            # missing permissions, closed direct messages or the user has already left
+            print(f"Enforcement - failed to {verdict['punishment']} "
+                  f"{member.name}: {exception}")
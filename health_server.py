@@ -0,0 +1,120 @@
+import asyncio
+import math
+import time
+
+from aiohttp import web
+
+from metrics import REGISTRY
+from settings import get_config
+
+HEALTH_SERVER_HOST = get_config("HEALTH_SERVER_HOST")
+HEALTH_SERVER_PORT = get_config("HEALTH_SERVER_PORT")
+
+# how often the event loop lag is measured, in seconds
+LOOP_LAG_INTERVAL = 1
+
+# a loop lagging more than this, in seconds, is reported as unhealthy
+MAX_LOOP_LAG = get_config("HEALTH_MAX_LOOP_LAG")
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def finite_or_none(value: float) -> float | None:
+    """The gateway latency is nan or inf while the bot is not connected."""
+
+    return value if math.isfinite(value) else None
+
+
+class HealthServer:
+    """Small HTTP server running on the bot's event loop, answering
+    the keep alive pings, health checks and metric scrapes."""
+
+    def __init__(self, bot) -> None:
+        self.bot = bot
+        self.started_at = time.monotonic()
+
+        # how late the last lag measurement woke up, in seconds
+        self.loop_lag = 0.0
+        self.lag_task: asyncio.Task | None = None
+
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get("/", self.home_page),
+            web.get("/healthz", self.healthz),
+            web.get("/metrics", self.metrics)
+        ])
+        self.runner: web.AppRunner | None = None
+
+    async def start(self) -> None:
+        """Starts listening and measuring the loop lag."""
+
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, HEALTH_SERVER_HOST, HEALTH_SERVER_PORT).start()
+
+        self.lag_task = asyncio.create_task(self.measure_loop_lag())
+        print(f"Health server listening on port {HEALTH_SERVER_PORT}.")
+
+    async def stop(self) -> None:
+        if self.lag_task is not None:
+            self.lag_task.cancel()
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    async def measure_loop_lag(self) -> None:
+        """Measures how much later than requested a
+        sleep wakes up, blocking code delays it."""
+
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag = max(loop.time() - start - LOOP_LAG_INTERVAL, 0.0)
+
+    def health(self) -> dict:
+        ready = self.bot.is_ready() and not self.bot.is_closed()
+        return {
+            "healthy": ready and self.loop_lag < MAX_LOOP_LAG,
+            "ready": ready,
+            "gateway_latency": finite_or_none(self.bot.latency),
+            "loop_lag": self.loop_lag,
+            "uptime": time.monotonic() - self.started_at
+        }
+
+    def render_metrics(self) -> list[str]:
+        """Returns the health gauges and the metrics of
+        the registry in the prometheus text format."""
+
+        health = self.health()
+        latency = health["gateway_latency"]
+        gauges = [
+            ("catastrophia_bot_ready", "Whether the bot is connected and ready.",
+             int(health["ready"])),
+            ("catastrophia_gateway_latency_seconds",
+             "Latency of the gateway heartbeat.",
+             latency if latency is not None else float("nan")),
+            ("catastrophia_event_loop_lag_seconds",
+             "How late the event loop ran the last lag probe.", self.loop_lag),
+            ("catastrophia_uptime_seconds", "Seconds since the health server started.",
+             health["uptime"])
+        ]
+
+        lines = []
+        for name, description, value in gauges:
+            lines += [f"# HELP {name} {description}",
+                      f"# TYPE {name} gauge",
+                      f"{name} {value}"]
+        return lines + REGISTRY.render()
+
+    async def home_page(self, _: web.Request) -> web.Response:
+        """Answers the keep alive pings."""
+
+        return web.Response(text="Catastrophia Bot - health_server.py")
+
+    async def healthz(self, _: web.Request) -> web.Response:
+        health = self.health()
+        return web.json_response(health, status=200 if health["healthy"] else 503)
+
+    async def metrics(self, _: web.Request) -> web.Response:
+        return web.Response(text="\n".join(self.render_metrics()) + "\n",
+                            headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
@@ -1,43 +1,34 @@
+import asyncio
+import copy
 import json
+import os
+
 import discord
 from discord import app_commands
-from discord.ext import commands
-from discord import Embed
-from discord_bot import CatastrophiaBot
-from methods import embed_message
-from settings import get_secret
 from discord.app_commands import Choice
+from discord.ext import commands, tasks
 
+from capabilities import Capabilities
+from discord_bot import CatastrophiaBot
+from enforcement_queue import EnforcementQueue
+from methods import embed_message
+from metrics import MESSAGES_SCANNED, MODERATION_VERDICTS
+from offensive_matcher import CompiledMatcher, load_raw_list, word_set_signature
+from settings import get_config, get_secret, package_path
+from verdict_log import VerdictLog, format_summary, summarize
 
 GUILD_ID = get_secret("GUILD_ID")
 
+# edited messages are only dispatched when the original is cached
+CAPABILITIES = Capabilities(intents=["guild_messages", "message_content"],
+                            max_messages=1000)
+OFFENSIVE_LIST_WATCH_DELAY = get_config("OFFENSIVE_LIST_WATCH_DELAY")
 
-def create_crime_report(user_id: int,
-                        channel_id: int,
-                        crime_type: str,
-                        offensive_message_content: str,
-                        punishment: str) -> Embed:
-    """Creates a discord Embed that will display the information about the message that was moderated."""
-
-    # initiating the embed
-    embed = discord.Embed(title="Thought crime detected", description="A user is suspected of a thoughtcrime.",
-                          color=0xff0000)
-
-    # big brother thumbnail
-    embed.set_thumbnail(
-        url="https://caquiscaidosblog.files.wordpress.com/2009/01/1984-movie-bb2_a.jpg")
-
-    # embed fields
-    embed.add_field(name="User", value=f"<@{user_id}>", inline=True)
-    embed.add_field(name="Channel", value=f"<#{channel_id}>", inline=True)
-    embed.add_field(name="Crime", value=crime_type, inline=True)
-    embed.add_field(name="Message", value=offensive_message_content, inline=False)
-    embed.add_field(name="Punishment", value=punishment, inline=False)
-
-    # footer for design purposes
-    embed.set_footer(text="CatastrophiaBot")
-
-    return embed
+# shadow mode only logs verdicts without deleting, reporting or punishing anything
+MODERATION_SHADOW_MODE = get_config("MODERATION_SHADOW_MODE")
+VERDICT_LOG_PATH = package_path(get_config("VERDICT_LOG_PATH"))
+VERDICT_LOG_MAX_BYTES = get_config("VERDICT_LOG_MAX_BYTES")
+VERDICT_LOG_BACKUPS = get_config("VERDICT_LOG_BACKUPS")
 
 
 class ThoughtPolice(commands.Cog):
@@ -57,27 +48,22 @@ class ThoughtPolice(commands.Cog):
 
     class OffensiveManager:
 
-        OFFENSIVE_LIST_PATH = "offensive_list.json"
+        OFFENSIVE_LIST_PATH = package_path("offensive_list.json")
 
         def __init__(self):
 
             # main internal raw list
-            with open(self.OFFENSIVE_LIST_PATH, "r") as read:
-                self.raw_list = json.load(read)
-
-            # loading the two main separate lists
-            self.full_exact_match_list = None
-            self.full_any_match_list = None
-            self.reload_full_lists()
+            self.raw_list = load_raw_list(self.OFFENSIVE_LIST_PATH)
+            self.file_modified_time = os.path.getmtime(self.OFFENSIVE_LIST_PATH)
 
-        def reload_full_lists(self):
-            """Loads all sections and their lists to two separate lists to make checking for offensive words easier."""
+            # the compiled matcher is never modified,
+            # only replaced as a whole by a newer version
+            self.matcher = CompiledMatcher(self.raw_list)
 
-            self.full_exact_match_list = []
-            self.full_any_match_list = []
-            for crime_type, specs in self.raw_list.items():
-                self.full_exact_match_list += specs["exact_match_list"]
-                self.full_any_match_list += specs["any_match_list"]
+            # version and word set of the most recently scheduled matcher
+            self.latest_version = self.matcher.version
+            self.latest_signature = self.matcher.signature
+            self.rebuild_task: asyncio.Task | None = None
 
         def save_raw_list_to_file(self):
             """Saves the internal raw list to a json file."""
@@ -85,6 +71,65 @@ class ThoughtPolice(commands.Cog):
             with open(self.OFFENSIVE_LIST_PATH, "w") as w:
                 json.dump(self.raw_list, w, indent=4)
 
+            # own changes to the file should not be mistaken for external edits
+            self.file_modified_time = os.path.getmtime(self.OFFENSIVE_LIST_PATH)
+
+        def schedule_rebuild(self) -> None:
+            """Builds a new matcher in the background if
+            the word set of the raw list has changed."""
+
+            signature = word_set_signature(self.raw_list)
+            if signature == self.latest_signature:
+                return
+
+            self.latest_version += 1
+            self.latest_signature = signature
+
+            # the builder gets its own copy, so later edits
+            # of the raw list can't change it mid-build
+            self.rebuild_task = asyncio.create_task(
+                self.rebuild_matcher(copy.deepcopy(self.raw_list), self.latest_version))
+
+        async def rebuild_matcher(self, raw_list: dict, version: int) -> None:
+            """Compiles a matcher outside the event loop and
+            swaps it in unless a newer version already was."""
+
+            matcher = await asyncio.to_thread(CompiledMatcher, raw_list, version)
+
+            if matcher.version > self.matcher.version:
+                self.matcher = matcher
+
+        async def reload_if_modified(self) -> None:
+            """Reloads the raw list if the json file was edited outside of the bot."""
+
+            try:
+                modified_time = os.path.getmtime(self.OFFENSIVE_LIST_PATH)
+            except OSError as exception:
+                # the file is possibly being replaced, trying again on the next check
+                print(f"ThoughtPolice - offensive list unavailable: {exception}")
+                return
+
+            if modified_time == self.file_modified_time:
+                return
+
+            try:
+                raw_list = await asyncio.to_thread(load_raw_list,
+                                                   self.OFFENSIVE_LIST_PATH)
+            except (OSError, json.JSONDecodeError) as exception:
+                # the file is possibly still being
+                # written, trying again on the next check
+                print(f"ThoughtPolice - invalid offensive list: {exception}")
+                return
+
+            self.file_modified_time = modified_time
+            self.raw_list = raw_list
+            self.schedule_rebuild()
+
+        def get_punishment(self, crime_type: str) -> str:
+            """Returns the current punishment for a set crime type."""
+
+            return self.raw_list.get(crime_type, {}).get("punishment", "warn")
+
         def get_crime_details(self, offensive_word: str) -> tuple | None:
             """Extracts information about a set word."""
 
@@ -112,7 +157,7 @@ class ThoughtPolice(commands.Cog):
             # be pre-made choices
             self.raw_list[crime_type][list_type].append(word)
             self.save_raw_list_to_file()
-            self.reload_full_lists()
+            self.schedule_rebuild()
 
         def remove_word(self, word: str) -> bool:
             """Removes a word from the internal raw list of offensive words."""
@@ -128,7 +173,7 @@ class ThoughtPolice(commands.Cog):
             crime_type, _, list_type = details
             self.raw_list[crime_type][list_type].remove(word)
             self.save_raw_list_to_file()
-            self.reload_full_lists()
+            self.schedule_rebuild()
 
             # removed successfully
             return True
@@ -136,55 +181,85 @@ class ThoughtPolice(commands.Cog):
         def change_punishment(self, crime_type: str, new_punishment: str) -> None:
             """Changes the punishment for a set crime type."""
 
-            # should not throw an error as crime_type is a pre-made choice
+            # should not throw an error as crime_type is a
+            # pre-made choice, the matcher stays the same
             self.raw_list[crime_type]["punishment"] = new_punishment
             self.save_raw_list_to_file()
-            self.reload_full_lists()
 
     def __init__(self, bot: CatastrophiaBot) -> None:
         self.bot = bot
-        self.offensive_manager = ThoughtPolice.OffensiveManager()
 
-    async def moderate_message(self, message: discord.Message):
+        # reading and compiling the offensive list blocks, it is done in cog_load
+        self.offensive_manager: ThoughtPolice.OffensiveManager | None = None
+
+        # verdicts are enforced in batches to avoid rate limits during raids
+        self.enforcement_queue = EnforcementQueue(bot)
+
+        self.verdict_log = VerdictLog(VERDICT_LOG_PATH, VERDICT_LOG_MAX_BYTES,
+                                      VERDICT_LOG_BACKUPS)
+
+        # queued verdicts are enforced and the scan count written before shutting down
+        bot.shutdown_manager.register("drain", "verdicts", self.enforcement_queue.drain)
+        bot.shutdown_manager.register("flush", "verdict log", self.flush_verdict_log)
+
+    async def cog_load(self) -> None:
+        """Compiles the offensive list without blocking
+        the other cogs and starts watching it."""
+
+        self.offensive_manager = await asyncio.to_thread(ThoughtPolice.OffensiveManager)
+        self.watch_offensive_list.start()
+
+    async def cog_unload(self) -> None:
+        """Stops the enforcement of queued verdicts and watching the offensive list."""
+
+        self.enforcement_queue.stop()
+        self.watch_offensive_list.cancel()
+        self.verdict_log.flush()
+
+    async def flush_verdict_log(self) -> None:
+        self.verdict_log.flush()
+
+    @tasks.loop(seconds=OFFENSIVE_LIST_WATCH_DELAY)
+    async def watch_offensive_list(self):
+        """Picks up edits of the offensive list made outside of the bot."""
+
+        await self.offensive_manager.reload_if_modified()
+
+    async def moderate_message(self, message: discord.Message, edited: bool = False):
         verdict = None
 
-        # find an offence that matches any part of the message
-        for any_match_word in self.offensive_manager.full_any_match_list:
-            if any_match_word in message.content:
-                crime_type, punishment, _ = self.offensive_manager.get_crime_details(any_match_word)
-                verdict = crime_type, punishment, any_match_word
-                break
-        else:
-            # find full exact match offences
-            message_words = message.content.split(" ")
-            for message_word in message_words:
-                if message_word in self.offensive_manager.full_exact_match_list:
-                    crime_type, punishment, _ = self.offensive_manager.get_crime_details(message_word)
-                    verdict = crime_type, punishment, message_word
-                    break
+        # the matcher is kept for the whole check, even
+        # if a newer version is swapped in meanwhile
+        matcher = self.offensive_manager.matcher
+        found = matcher.match(message.content)
+        MESSAGES_SCANNED.inc(("thought_police",))
+
+        if MODERATION_SHADOW_MODE:
+            # only recording what would have happened, an edited
+            # message was already counted when it was sent
+            if not edited:
+                self.verdict_log.count_scanned()
+            if found is not None:
+                offensive_word, span = found
+                if self.verdict_log.log_verdict(message.id, message.channel.id,
+                                                offensive_word, span):
+                    MODERATION_VERDICTS.inc(("thought_police", "shadow"))
+            return
+
+        if found is not None:
+            offensive_word, _ = found
+            crime_type = matcher.crime_type(offensive_word)
+            punishment = self.offensive_manager.get_punishment(crime_type)
+            verdict = crime_type, punishment, offensive_word
 
         if verdict is not None:
             crime_type, punishment, offensive_word = verdict
-            # remove the offensive message
-            await message.delete()
-
-            # send a report
-            report_embed = create_crime_report(
-                message.author.id,
-                message.channel.id,
-                crime_type,
-                message.content.replace(
-                    offensive_word,
-                    f"**{offensive_word}**"
-                ),
-                punishment
-            )
-
-            removed_message_embed = Embed(title=f"Removed a message from {message.author.display_name}", color=0xffffff,
-                                          description=f"**Reason:** oldspeak")
-            removed_message_embed.set_footer(text=f"CatastrophiaBot")
-            await message.channel.send(embed=removed_message_embed)
-            await message.channel.send(embed=report_embed)
+            MODERATION_VERDICTS.inc(("thought_police", punishment))
+
+            # the message removal, report and punishment
+            # happen in the next enforcement window
+            self.enforcement_queue.submit(message, crime_type, punishment,
+                                          offensive_word)
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -194,8 +269,8 @@ class ThoughtPolice(commands.Cog):
         if message.author.id == self.bot.user.id:
             return
 
-        if message.channel.id != 778258665525346345:
-            # dev block only work in testing
+        if message.channel.id != 778258665525346345 and not MODERATION_SHADOW_MODE:
+            # dev block only work in testing, shadow mode evaluates every message
             return
 
         await self.moderate_message(message)
@@ -204,15 +279,15 @@ class ThoughtPolice(commands.Cog):
     async def on_message_edit(self, _, message: discord.Message):
         """Moderates message edits."""
 
-        # testing channel only
-        if message.channel.id != 778258665525346345:
+        # testing channel only, unless in shadow mode
+        if message.channel.id != 778258665525346345 and not MODERATION_SHADOW_MODE:
             return
 
         # blocking message cycle
         if message.author.id == self.bot.user.id:
             return
 
-        await self.moderate_message(message)
+        await self.moderate_message(message, edited=True)
 
     @app_commands.command(
         name="add_offensive_word",
@@ -300,6 +375,20 @@ class ThoughtPolice(commands.Cog):
             f"Changed the punishment for {crime_type.name} to '{punishment.name}'."
         ))
 
+    @app_commands.command(
+        name="moderation_summary",
+        description="Shows how often every offensive word was found by the moderation."
+    )
+    async def moderation_summary(self, interaction: discord.Interaction):
+        """Summarizes the verdict log into hits and hit rates per offensive word."""
+
+        # makes sure the latest scanned messages are counted
+        self.verdict_log.flush()
+        summary = await asyncio.to_thread(summarize, VERDICT_LOG_PATH)
+
+        await interaction.response.send_message(
+            embed_message(format_summary(summary, limit=25)), ephemeral=True)
+
 
 async def setup(bot: CatastrophiaBot) -> None:
     await bot.add_cog(
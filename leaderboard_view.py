@@ -0,0 +1,62 @@
+import discord
+
+from methods import embed_message
+from ranking import Leaderboard, render_sections
+
+# how long the buttons of a sent leaderboard keep working, in seconds
+LEADERBOARD_VIEW_TIMEOUT = 300
+
+# players shown on a single page
+LEADERBOARD_PAGE_SIZE = 10
+
+
+def render_pages(leaderboard: Leaderboard,
+                 updated_at: int,
+                 page_size: int = LEADERBOARD_PAGE_SIZE) -> list[str]:
+    """Renders every page of the leaderboard once,
+    so paging only picks a ready message."""
+
+    sections = render_sections(leaderboard, section_size=page_size)
+    return [f"{embed_message(section)}"
+            f"Page {number}/{len(sections)}, updated <t:{updated_at}:R>"
+            for number, section in enumerate(sections, 1)]
+
+
+class LeaderboardView(discord.ui.View):
+    """Buttons paging through pre-rendered leaderboard pages."""
+
+    def __init__(self, pages: list[str], page: int = 0) -> None:
+        super().__init__(timeout=LEADERBOARD_VIEW_TIMEOUT)
+
+        # the pages of the snapshot the view was
+        # opened with, a refresh does not change them
+        self.pages = pages
+        self.page = page
+        self.update_buttons()
+
+    def update_buttons(self) -> None:
+        self.first_page.disabled = self.previous_page.disabled = self.page == 0
+        on_last_page = self.page == len(self.pages) - 1
+        self.next_page.disabled = self.last_page.disabled = on_last_page
+
+    async def show(self, interaction: discord.Interaction, page: int) -> None:
+        self.page = page
+        self.update_buttons()
+        await interaction.response.edit_message(content=self.pages[self.page],
+                                                view=self)
+
+    @discord.ui.button(label="<<", style=discord.ButtonStyle.secondary)
+    async def first_page(self, interaction: discord.Interaction, _):
+        await self.show(interaction, 0)
+
+    @discord.ui.button(label="<", style=discord.ButtonStyle.primary)
+    async def previous_page(self, interaction: discord.Interaction, _):
+        await self.show(interaction, max(self.page - 1, 0))
+
+    @discord.ui.button(label=">", style=discord.ButtonStyle.primary)
+    async def next_page(self, interaction: discord.Interaction, _):
+        await self.show(interaction, min(self.page + 1, len(self.pages) - 1))
+
+    @discord.ui.button(label=">>", style=discord.ButtonStyle.secondary)
+    async def last_page(self, interaction: discord.Interaction, _):
+        await self.show(interaction, len(self.pages) - 1)
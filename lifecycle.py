@@ -0,0 +1,65 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from discord.ext import tasks
+
+# shutdown stages in the order they run:
+# stop - no new work is started, running iterations are finished
+# drain - queued work (role edits, notifications, verdicts) is done
+# flush - persistent stores are written and closed
+SHUTDOWN_STAGES = ("stop", "drain", "flush")
+
+# every stage gets at least this long, in seconds, so
+# a slow stage does not prevent flushing the stores
+MINIMUM_STAGE_TIME = 1
+
+ShutdownHook = Callable[[], Awaitable[None]]
+
+
+async def stop_loop(loop: tasks.Loop, lock: asyncio.Lock) -> None:
+    """Waits for the running iteration of a loop to finish and cancels the loop.
+    The loop holds the lock during every iteration."""
+
+    async with lock:
+        loop.cancel()
+
+
+class ShutdownManager:
+    """Runs the registered shutdown hooks stage
+    by stage, all of them within a deadline."""
+
+    def __init__(self) -> None:
+        # stage -> (name, hook) in the order they were registered
+        self.hooks: dict[str, list[tuple[str, ShutdownHook]]] = {
+            stage: [] for stage in SHUTDOWN_STAGES
+        }
+
+    def register(self, stage: str, name: str, hook: ShutdownHook) -> None:
+        """Adds a coroutine function that is awaited during the stage."""
+
+        self.hooks[stage].append((name, hook))
+
+    async def run(self, deadline: float) -> None:
+        """Runs the hooks of every stage concurrently, hooks
+        still running at the deadline are abandoned."""
+
+        start = time.monotonic()
+        for stage in SHUTDOWN_STAGES:
+            hooks = self.hooks[stage]
+            if not hooks:
+                continue
+
+            remaining = deadline - (time.monotonic() - start)
+            tasks_by_name = {name: asyncio.create_task(hook()) for name, hook in hooks}
+            timeout = max(remaining, MINIMUM_STAGE_TIME)
+            done, pending = await asyncio.wait(tasks_by_name.values(), timeout=timeout)
+
+            for name, task in tasks_by_name.items():
+                if task in pending:
+                    task.cancel()
+                    print(f"Shutdown - '{name}' did not finish before the deadline.")
+                elif task.exception() is not None:
+                    print(f"Shutdown - '{name}' failed: {task.exception()}")
+
+        print(f"Shutdown hooks finished in {time.monotonic() - start:.1f} s.")
@@ -1,29 +1,43 @@
 import json
-import hashlib
 
-FILE_PATH = "linked_users.json"
+from settings import package_path
+
+FILE_PATH = package_path("linked_users.json")
 
 
 class LinkManager:
 
     def __init__(self):
         self.temp_dict: dict = None
+
+        # lowercased roblox username -> discord id, kept in sync with temp_dict
+        self.discord_ids: dict[str, int] = {}
         self.load_file()
 
     def load_file(self):
         with open(FILE_PATH, "r") as read:
             self.temp_dict = json.load(read)
 
+        self.discord_ids = {roblox_username.lower(): int(discord_id)
+                            for discord_id, roblox_username in self.temp_dict.items()}
+
     def save_file(self):
         with open(FILE_PATH, "w") as write:
             json.dump(self.temp_dict, write, indent=4)
 
     def add_user(self, roblox_username: str, discord_id: int):
+        previous_username = self.temp_dict.get(str(discord_id))
+        if previous_username is not None:
+            self.discord_ids.pop(previous_username.lower(), None)
+
         self.temp_dict[str(discord_id)] = roblox_username
+        self.discord_ids[roblox_username.lower()] = discord_id
         self.save_file()
 
     def remove_user(self, discord_id: int):
-        del self.temp_dict[str(discord_id)]
+        roblox_username = self.temp_dict.pop(str(discord_id))
+        if self.discord_ids.get(roblox_username.lower()) == discord_id:
+            del self.discord_ids[roblox_username.lower()]
         self.save_file()
 
     def is_discord_id_linked(self, discord_id):
@@ -38,10 +52,4 @@ class LinkManager:
         return username
 
     def get_discord_id(self, roblox_username):
-        roblox_username = roblox_username.lower()
-        found_discord_id = None
-        for key, value in self.temp_dict.items():
-            if value.lower() == roblox_username:
-                found_discord_id = int(key)
-                break
-        return found_discord_id
+        return self.discord_ids.get(roblox_username.lower())
@@ -0,0 +1,93 @@
+import json
+import os
+import time
+
+from settings import get_config, package_path
+
+LINK_STATE_PATH = package_path(get_config("LINK_STATE_PATH"))
+
+
+class LinkStateStore:
+    """Saves the pending linking requests and linking bans to a json
+    file, so they survive restarts. Only ids and timestamps are
+    stored, discord objects are resolved when they are needed."""
+
+    def __init__(self):
+        # lowercased roblox username -> request
+        self.pending_requests: dict[str, dict] = {}
+
+        # discord user id -> lowercased roblox username of the user's pending request
+        self.pending_by_user: dict[int, str] = {}
+
+        # discord user id -> expiration date of the ban
+        self.linking_bans: dict[int, float] = {}
+
+        self.load_file()
+
+    def load_file(self):
+        if not os.path.exists(LINK_STATE_PATH):
+            return
+
+        with open(LINK_STATE_PATH, "r") as read:
+            state = json.load(read)
+
+        self.pending_requests = state["pending_requests"]
+        self.pending_by_user = {request["discord_user_id"]: key
+                                for key, request in self.pending_requests.items()}
+
+        # bans that expired while the bot was offline are not restored
+        now = time.time()
+        self.linking_bans = {int(user_id): expiration_date
+                             for user_id, expiration_date
+                             in state["linking_bans"].items()
+                             if expiration_date > now}
+
+    def save_file(self):
+        with open(LINK_STATE_PATH, "w") as write:
+            json.dump({
+                "pending_requests": self.pending_requests,
+                "linking_bans": {str(user_id): expiration_date
+                                 for user_id, expiration_date
+                                 in self.linking_bans.items()}
+            }, write, indent=4)
+
+    def add_request(self,
+                    roblox_username: str,
+                    discord_user_id: int,
+                    channel_id: int) -> dict:
+        """Saves a new linking request, a request for the same username is replaced."""
+
+        key = roblox_username.lower()
+        self.remove_request(key, save=False)
+
+        new_link_request = {
+            "roblox_username": roblox_username,
+            "discord_user_id": discord_user_id,
+            "channel_id": channel_id,
+            "start_time": time.time()
+        }
+        self.pending_requests[key] = new_link_request
+        self.pending_by_user[discord_user_id] = key
+        self.save_file()
+
+        return new_link_request
+
+    def remove_request(self, key: str, save: bool = True) -> dict | None:
+        """Removes a linking request and returns it."""
+
+        local_request = self.pending_requests.pop(key, None)
+        if local_request is None:
+            return None
+
+        self.pending_by_user.pop(local_request["discord_user_id"], None)
+        if save:
+            self.save_file()
+        return local_request
+
+    def add_ban(self, discord_user_id: int, expiration_date: float) -> None:
+        self.linking_bans[discord_user_id] = expiration_date
+        self.save_file()
+
+    def remove_ban(self, discord_user_id: int) -> None:
+        if self.linking_bans.pop(discord_user_id, None) is not None:
+            self.save_file()
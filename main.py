@@ -1,11 +1,50 @@
-import settings
-from discord_bot import CatastrophiaBot
-from keep_alive import start_server
+import argparse
+import asyncio
+import contextlib
+import signal
+
+import discord
+
+from discord_bot import BOT_TOKEN, CatastrophiaBot
+from health_server import HealthServer
+from metrics import install_rate_limit_counter
+
+
+async def main(force_sync: bool) -> None:
+    """Runs the bot until it is closed, a SIGINT or SIGTERM shuts it down gracefully."""
+
+    bot = CatastrophiaBot(force_sync=force_sync)
+
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        # signal handlers are not supported on windows, ctrl+c
+        # stops the bot there without the shutdown hooks
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(signal_number, bot.request_shutdown)
+
+    # answers keep alive pings, health checks and
+    # metric scrapes on the bot's own event loop
+    health_server = HealthServer(bot)
+    await health_server.start()
+
+    try:
+        async with bot:
+            await bot.start(BOT_TOKEN)
+    finally:
+        await health_server.stop()
+
 
 if __name__ == "__main__":
-    # don't start keep_alive server on local run
-    if settings.ON_REPLIT:
-        start_server()
+    parser = argparse.ArgumentParser(description="Runs the Catastrophia discord bot.")
+    parser.add_argument("--sync", action="store_true",
+                        help="syncs the command tree even if it has not changed "
+                             "since the last sync")
+    arguments = parser.parse_args()
+
+    # bot.start does not configure logging like
+    # bot.run, the rate limit warnings are also counted
+    discord.utils.setup_logging()
+    install_rate_limit_counter()
 
     # discord bot start
-    CatastrophiaBot()
+    asyncio.run(main(arguments.sync))
@@ -0,0 +1,102 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import discord
+
+from settings import get_config
+
+MEMBER_RESOLVER_CACHE_SIZE = get_config("MEMBER_RESOLVER_CACHE_SIZE")
+
+# fetched members are reused for this long, in
+# seconds, their roles might be outdated afterwards
+MEMBER_RESOLVER_TTL = get_config("MEMBER_RESOLVER_TTL")
+
+# discord answers a member query with at most 100 user ids
+QUERY_MEMBERS_LIMIT = 100
+
+
+class MemberResolver:
+    """Resolves member ids without the full member list being cached.
+    Members missing from the cache are fetched in batches with a single
+    gateway query each and kept in a small cache of their own."""
+
+    def __init__(self,
+                 max_size: int = MEMBER_RESOLVER_CACHE_SIZE,
+                 ttl: float = MEMBER_RESOLVER_TTL) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # (guild id, user id) -> (fetch time, member), the least recently used first
+        self.cache: OrderedDict[tuple[int, int],
+                                tuple[float, discord.Member]] = OrderedDict()
+
+    def cached(self, guild: discord.Guild, user_id: int) -> discord.Member | None:
+        """Returns a member from the guild cache or a recently fetched one."""
+
+        member = guild.get_member(user_id)
+        if member is not None:
+            return member
+
+        key = (guild.id, user_id)
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+
+        fetched_at, member = entry
+        if time.monotonic() - fetched_at > self.ttl:
+            del self.cache[key]
+            return None
+
+        self.cache.move_to_end(key)
+        return member
+
+    def remember(self, member: discord.Member) -> None:
+        self.cache[(member.guild.id, member.id)] = (time.monotonic(), member)
+        self.cache.move_to_end((member.guild.id, member.id))
+
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    def forget(self, guild_id: int, user_id: int) -> None:
+        """Drops a fetched member, e.g. after their roles were changed."""
+
+        self.cache.pop((guild_id, user_id), None)
+
+    async def resolve_many(self,
+                           guild: discord.Guild,
+                           user_ids) -> dict[int, discord.Member]:
+        """Returns the members of the user ids, users
+        that are not in the guild are left out."""
+
+        members = {}
+        missing = []
+        for user_id in user_ids:
+            member = self.cached(guild, user_id)
+            if member is None:
+                missing.append(user_id)
+            else:
+                members[user_id] = member
+
+        for start in range(0, len(missing), QUERY_MEMBERS_LIMIT):
+            batch = missing[start:start + QUERY_MEMBERS_LIMIT]
+            try:
+                fetched = await guild.query_members(user_ids=batch, limit=len(batch),
+                                                    cache=False)
+            except (discord.ClientException, asyncio.TimeoutError) as exception:
+                # the members intent is missing or the gateway did not answer
+                print(f"MemberResolver - query failed: {exception}")
+                break
+
+            for member in fetched:
+                self.remember(member)
+                members[member.id] = member
+
+        return members
+
+    async def resolve(self,
+                      guild: discord.Guild,
+                      user_id: int) -> discord.Member | None:
+        """Returns the member of a single user id."""
+
+        return (await self.resolve_many(guild, [user_id])).get(user_id)
@@ -0,0 +1,116 @@
+import asyncio
+import datetime
+from typing import Awaitable, Callable
+
+import discord
+
+# discord refuses bulk deletes of more than 100
+# messages or of messages older than 14 days
+BULK_DELETE_LIMIT = 100
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14)
+
+# a safety margin for messages that turn 14 days old while they are being deleted
+BULK_DELETE_AGE_MARGIN = datetime.timedelta(minutes=10)
+
+# delay between removals of messages that are too old for a bulk delete
+SINGLE_DELETE_DELAY = 1.0
+
+# called with the amount of messages deleted so far
+ProgressCallback = Callable[[int], Awaitable[None]]
+
+# awaited before every delete request, paces the requests of several concurrent cleaners
+RequestPacer = Callable[[], Awaitable[None]]
+
+
+async def collect_messages(channel: discord.abc.Messageable,
+                           predicate: Callable[[discord.Message], bool],
+                           limit: int,
+                           scan_limit: int) -> tuple[list[discord.Message], int]:
+    """Pages through the channel history from the newest message until the
+    limit of matching messages is found or scan_limit messages were
+    checked. Returns the found messages and the amount of scanned ones."""
+
+    found = []
+    scanned = 0
+    async for message in channel.history(limit=scan_limit):
+        scanned += 1
+        if predicate(message):
+            found.append(message)
+
+            # found the desired amount of messages
+            if len(found) >= limit:
+                break
+
+    return found, scanned
+
+
+def split_by_age(
+        messages: list[discord.Message]
+) -> tuple[list[discord.Message], list[discord.Message]]:
+    """Splits messages into the ones that can still be bulk
+    deleted and the ones that have to be deleted one by one."""
+
+    bulk_cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE + BULK_DELETE_AGE_MARGIN
+
+    recent_messages = []
+    old_messages = []
+    for message in messages:
+        if message.created_at > bulk_cutoff:
+            recent_messages.append(message)
+        else:
+            old_messages.append(message)
+
+    return recent_messages, old_messages
+
+
+async def delete_messages(channel: discord.TextChannel,
+                          messages: list[discord.Message],
+                          reason: str | None = None,
+                          on_progress: ProgressCallback | None = None,
+                          pacer: RequestPacer | None = None) -> int:
+    """Removes the messages from a channel using as few requests as
+    possible and returns how many were removed. Without a pacer,
+    old messages are removed one per SINGLE_DELETE_DELAY."""
+
+    recent_messages, old_messages = split_by_age(messages)
+    deleted = 0
+
+    # recent messages are removed in chunks of bulk deletes
+    for i in range(0, len(recent_messages), BULK_DELETE_LIMIT):
+        chunk = recent_messages[i:i + BULK_DELETE_LIMIT]
+        if pacer is not None:
+            await pacer()
+        try:
+            await channel.delete_messages(chunk, reason=reason)
+        except discord.HTTPException as exception:
+            # messages might have already been removed by the user or a moderator
+            print(f"MessageCleaner - failed to delete messages "
+                  f"in #{channel.name}: {exception}")
+        else:
+            deleted += len(chunk)
+
+        if on_progress is not None:
+            await on_progress(deleted)
+
+    # old messages have to be removed one by one, at
+    # a slower pace to stay away from rate limits
+    for i, message in enumerate(old_messages):
+        if pacer is not None:
+            await pacer()
+        try:
+            await message.delete()
+        except discord.NotFound:
+            pass
+        except discord.HTTPException as exception:
+            print(f"MessageCleaner - failed to delete a message "
+                  f"in #{channel.name}: {exception}")
+        else:
+            deleted += 1
+
+        if on_progress is not None and (i + 1) % 10 == 0:
+            await on_progress(deleted)
+
+        if pacer is None:
+            await asyncio.sleep(SINGLE_DELETE_DELAY)
+
+    return deleted
@@ -0,0 +1,183 @@
+import logging
+from bisect import bisect_left
+
+# histogram buckets in seconds, fitting discord and API calls
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def format_labels(label_names: tuple[str, ...], labels: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"'
+             for name, value in zip(label_names, labels, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """A value that only goes up, one per combination of label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, label_names=()) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+
+        # label values -> value
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{format_labels(self.label_names, labels)} {value}"
+                for labels, value in self.values.items()]
+
+
+class Gauge(Counter):
+    """A value that can be set to anything."""
+
+    kind = "gauge"
+
+    def set(self, value: float, labels: tuple = ()) -> None:
+        self.values[labels] = value
+
+
+class Histogram:
+    """Counts observations in fixed buckets, the counts of a label combination are
+    allocated once and recording only increments a bucket found by a binary search."""
+
+    kind = "histogram"
+
+    def __init__(self,
+                 name: str,
+                 description: str,
+                 label_names=(),
+                 buckets=DURATION_BUCKETS) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+
+        # label values -> [count of every bucket..., count
+        # above the last bucket, sum of the observations]
+        self.series: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = []
+        for labels, series in self.series.items():
+            # prometheus buckets are cumulative, the sum
+            # at the end of the series is not a bucket
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1], strict=True):
+                cumulative += count
+                bucket_label = f'le="{bound}"'
+                bucket_labels = format_labels(self.label_names, labels, bucket_label)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+
+            series_labels = format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{series_labels} {series[-1]}")
+            lines.append(f"{self.name}_count{series_labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric of the bot and renders them in the prometheus text format."""
+
+    def __init__(self) -> None:
+        self.metrics: list[Counter | Gauge | Histogram] = []
+
+    def counter(self, name: str, description: str, label_names=()) -> Counter:
+        return self.add(Counter(name, description, label_names))
+
+    def gauge(self, name: str, description: str, label_names=()) -> Gauge:
+        return self.add(Gauge(name, description, label_names))
+
+    def histogram(self,
+                  name: str,
+                  description: str,
+                  label_names=(),
+                  buckets=DURATION_BUCKETS) -> Histogram:
+        return self.add(Histogram(name, description, label_names, buckets))
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> list[str]:
+        lines = []
+        for metric in self.metrics:
+            lines += [f"# HELP {metric.name} {metric.description}",
+                      f"# TYPE {metric.name} {metric.kind}"]
+            lines += metric.render()
+        return lines
+
+
+REGISTRY = MetricsRegistry()
+
+# app commands
+COMMAND_DURATION = REGISTRY.histogram(
+    "catastrophia_command_duration_seconds",
+    "Time from the interaction to the end of the command.", ["command"])
+COMMAND_ERRORS = REGISTRY.counter(
+    "catastrophia_command_errors_total", "App commands that raised an error.",
+    ["command"])
+
+# catastrophia API
+API_REQUEST_DURATION = REGISTRY.histogram(
+    "catastrophia_api_request_duration_seconds",
+    "Duration of Catastrophia API requests.", ["endpoint", "method", "status"])
+
+# link poller
+LINK_POLL_DURATION = REGISTRY.histogram(
+    "catastrophia_link_poll_duration_seconds",
+    "Duration of a linking request check cycle.")
+LINK_PENDING_REQUESTS = REGISTRY.gauge(
+    "catastrophia_link_pending_requests",
+    "Linking requests waiting for a confirmation.")
+LINK_RESULTS = REGISTRY.counter(
+    "catastrophia_link_results_total",
+    "Finished linking requests by their result.", ["result"])
+
+# role sync
+ROLE_EDITS = REGISTRY.counter(
+    "catastrophia_role_edits_total", "Top role edits issued by the role sync.",
+    ["action"])
+DISCORD_RATE_LIMITS = REGISTRY.counter(
+    "catastrophia_discord_rate_limits_total",
+    "Discord requests that were answered with 429.", ["route"])
+
+# moderation
+MESSAGES_SCANNED = REGISTRY.counter(
+    "catastrophia_messages_scanned_total", "Messages evaluated by a moderation cog.",
+    ["cog"])
+MODERATION_VERDICTS = REGISTRY.counter(
+    "catastrophia_moderation_verdicts_total",
+    "Moderation verdicts by the cog and the punishment.", ["cog", "punishment"])
+
+
+class RateLimitCounter(logging.Handler):
+    """Counts the rate limit warnings discord.py logs before retrying a request.
+    Member role edits are counted separately, as they are what the role sync sends."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if not str(record.msg).startswith("We are being rate limited"):
+            return
+
+        has_url = isinstance(record.args, tuple) and len(record.args) > 1
+        url = str(record.args[1]) if has_url else ""
+        route = "member_roles" if "/members/" in url and "/roles/" in url else "other"
+        DISCORD_RATE_LIMITS.inc((route,))
+
+
+def install_rate_limit_counter() -> None:
+    logger = logging.getLogger("discord.http")
+    logger.addHandler(RateLimitCounter(level=logging.WARNING))
@@ -0,0 +1,124 @@
+import json
+import re
+
+
+def load_raw_list(path: str) -> dict:
+    """Loads the raw offensive list from a json file."""
+
+    with open(path, "r") as read:
+        return json.load(read)
+
+
+def word_set_signature(raw_list: dict) -> frozenset:
+    """Returns everything from the raw list that affects
+    matching, punishments are left out on purpose."""
+
+    return frozenset(
+        (word, crime_type, list_type)
+        for crime_type, specs in raw_list.items()
+        for list_type in ("exact_match_list", "any_match_list")
+        for word in specs[list_type]
+    )
+
+
+def trie_pattern(words) -> str:
+    """Builds a regular expression matching any of the words, with common
+    prefixes factored out. The regex engine tries alternatives one by
+    one, so a prefix tree rejects most positions after a character."""
+
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for character in word:
+            node = node.setdefault(character, {})
+        # the empty key marks the end of a word
+        node[""] = {}
+
+    def render(node: dict) -> str:
+        alternatives = [re.escape(character) + render(child)
+                        for character, child in sorted(node.items()) if character]
+        if not alternatives:
+            return ""
+
+        # the end of a word makes the rest optional
+        optional = "" in node
+        if len(alternatives) == 1 and not optional:
+            return alternatives[0]
+        group = "(?:" + "|".join(alternatives) + ")"
+        return group + "?" if optional else group
+
+    return render(trie)
+
+
+class CompiledMatcher:
+    """An immutable matcher compiled from one version of the
+    offensive list. A new matcher is built for every change, so
+    matching in progress keeps using the version it started with."""
+
+    def __init__(self, raw_list: dict, version: int = 1) -> None:
+        self.version = version
+        self.signature = word_set_signature(raw_list)
+
+        # word -> (crime_type, list_type)
+        self.details: dict[str, tuple[str, str]] = {}
+        exact_match_words = []
+        for crime_type, specs in raw_list.items():
+            for word in specs["exact_match_list"]:
+                self.details.setdefault(word, (crime_type, "exact_match_list"))
+                exact_match_words.append(word)
+            for word in specs["any_match_list"]:
+                self.details.setdefault(word, (crime_type, "any_match_list"))
+
+        self.exact_match_words = frozenset(exact_match_words)
+
+        # (pattern, words) per crime type in the order
+        # of the list, earlier crime types take priority
+        self.any_match_sections: list[tuple[re.Pattern, list[str]]] = [
+            (re.compile(trie_pattern(specs["any_match_list"])), specs["any_match_list"])
+            for specs in raw_list.values()
+            if specs["any_match_list"]
+        ]
+
+        # a single scan for all any match words rejects
+        # most messages before the sections are checked
+        any_match_words = [word
+                           for _, words in self.any_match_sections
+                           for word in words]
+        self.any_match_pattern = re.compile(trie_pattern(any_match_words)) \
+            if any_match_words else None
+
+    def match(self, content: str) -> tuple[str, tuple[int, int]] | None:
+        """Finds an offensive word in the content and returns it with
+        its position in the content. Any match words are prioritised by
+        their order in the list, exact match words by their position."""
+
+        # find an offence that matches any part of
+        # the message, a single scan per crime type
+        if self.any_match_pattern is None \
+                or self.any_match_pattern.search(content) is None:
+            sections = []
+        else:
+            sections = self.any_match_sections
+
+        for pattern, words in sections:
+            if pattern.search(content) is not None:
+                # the first word of the section that
+                # occurs, like a scan of the flat list
+                for word in words:
+                    start = content.find(word)
+                    if start != -1:
+                        return word, (start, start + len(word))
+
+        # find full exact match offences
+        start = 0
+        for message_word in content.split(" "):
+            if message_word in self.exact_match_words:
+                return message_word, (start, start + len(message_word))
+            start += len(message_word) + 1
+
+        return None
+
+    def crime_type(self, word: str) -> str:
+        """Returns the crime type of a matched word."""
+
+        return self.details[word][0]
@@ -0,0 +1,145 @@
+import heapq
+import time
+from collections import deque
+
+from playtime_history import DAY, PlaytimeHistory
+
+
+class RollingGains:
+    """Playtime gained by every player in the last days,
+    kept as daily buckets and a running sum per player."""
+
+    def __init__(self, days: int) -> None:
+        self.days = days
+
+        # username -> [day, gained] buckets, oldest first
+        self.buckets: dict[str, deque[list[int]]] = {}
+
+        # username -> sum of the player's buckets
+        self.totals: dict[str, int] = {}
+
+    def add(self, username: str, gained: int, day: int) -> None:
+        """Adds gained playtime to the player's bucket of the day."""
+
+        buckets = self.buckets.setdefault(username, deque())
+        if buckets and buckets[-1][0] == day:
+            buckets[-1][1] += gained
+        else:
+            buckets.append([day, gained])
+
+        self.totals[username] = self.totals.get(username, 0) + gained
+
+    def expire(self, today: int) -> None:
+        """Drops the buckets that left the window."""
+
+        oldest_day = today - self.days + 1
+        for username in list(self.buckets):
+            buckets = self.buckets[username]
+            while buckets and buckets[0][0] < oldest_day:
+                self.totals[username] -= buckets.popleft()[1]
+
+            if not buckets:
+                del self.buckets[username]
+                del self.totals[username]
+
+    def top(self, amount: int) -> list[tuple[str, int]]:
+        """Returns the (username, gained) pairs of the players that gained the most."""
+
+        return heapq.nlargest(amount, self.totals.items(), key=lambda item: item[1])
+
+
+def spread_gain(gained: int, start: int, end: int, since: int) -> list[tuple[int, int]]:
+    """Splits playtime gained between the timestamps start and end
+    over the days in between, in proportion to the seconds of every
+    day. Only the (day, gained) shares after since are returned."""
+
+    if end <= start:
+        return [(end // DAY, gained)]
+
+    # the shares are differences of the cumulative gain,
+    # so they always add up without rounding errors
+    cursor = max(start, since)
+    assigned = gained * (cursor - start) // (end - start)
+    shares = []
+    while cursor < end:
+        day = cursor // DAY
+        day_end = min((day + 1) * DAY, end)
+        cumulative = gained * (day_end - start) // (end - start)
+        if cumulative > assigned:
+            shares.append((day, cumulative - assigned))
+        assigned = cumulative
+        cursor = day_end
+
+    return shares
+
+
+class GainTracker:
+    """Keeps rolling gains for several windows,
+    updated from the leaderboard snapshots."""
+
+    def __init__(self, windows: list[int], excluded=()) -> None:
+        self.windows = {days: RollingGains(days) for days in windows}
+
+        # lowercased usernames that never show up in the gains
+        self.excluded = {username.lower() for username in excluded}
+
+        # lowercased username -> (ts, playtime) of the last seen sample
+        self.latest: dict[str, tuple[int, int]] = {}
+
+    def seed(self, history: PlaytimeHistory, now: int | None = None) -> None:
+        """Replays the recorded samples of the longest window once, on startup."""
+
+        now = int(time.time()) if now is None else now
+        since = now - max(self.windows) * DAY
+
+        # the baseline keeps the time of its sample, so the
+        # gain up to the next sample is spread from there
+        self.latest = history.last_samples_at(since)
+        for username, ts, playtime in history.samples_since(since):
+            self.update_player(username, playtime, ts)
+
+        self.expire(now // DAY)
+
+    def update(self, playtimes: dict[str, int], ts: int | None = None) -> None:
+        """Adds the playtime gained since the previous snapshot to the windows."""
+
+        ts = int(time.time()) if ts is None else ts
+
+        for username, playtime in playtimes.items():
+            self.update_player(username.lower(), playtime, ts)
+
+        self.expire(ts // DAY)
+
+    def update_player(self, username: str, playtime: int, ts: int) -> None:
+        if username in self.excluded:
+            return
+
+        previous = self.latest.get(username)
+        self.latest[username] = (ts, playtime)
+
+        # the first sample of a player only sets the baseline,
+        # playtimes lowered by /forceplaytime are not gains
+        if previous is None or playtime <= previous[1]:
+            return
+
+        # a player seen again after weeks gained their
+        # playtime over all of those days, not only today
+        previous_ts, previous_playtime = previous
+        today = ts // DAY
+        since = (today - max(self.windows) + 1) * DAY
+        shares = spread_gain(playtime - previous_playtime, previous_ts, ts, since)
+
+        for gains in self.windows.values():
+            oldest_day = today - gains.days + 1
+            for day, gained in shares:
+                if day >= oldest_day:
+                    gains.add(username, gained, day)
+
+    def expire(self, today: int) -> None:
+        for gains in self.windows.values():
+            gains.expire(today)
+
+    def top(self, days: int, amount: int) -> list[tuple[str, int]]:
+        """Returns the players that gained the most playtime in the window of days."""
+
+        return self.windows[days].top(amount)
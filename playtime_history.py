@@ -0,0 +1,134 @@
+import sqlite3
+import time
+
+from settings import get_config, package_path
+
+PLAYTIME_HISTORY_PATH = package_path(get_config("PLAYTIME_HISTORY_PATH"))
+
+# samples younger than this are kept as they were recorded (hourly)
+HOURLY_RETENTION = get_config("PLAYTIME_HISTORY_HOURLY_DAYS") * 86400
+# older samples are thinned to one per day, samples older than this to one per week
+DAILY_RETENTION = get_config("PLAYTIME_HISTORY_DAILY_DAYS") * 86400
+
+DAY = 86400
+WEEK = 7 * DAY
+
+
+class PlaytimeHistory:
+    """Append-only time series of playtime samples stored in SQLite. Playtime
+    only grows, so a sample is only written when it differs from the player's
+    previous one, the playtime at any moment is the latest sample before it."""
+
+    def __init__(self, path: str = PLAYTIME_HISTORY_PATH) -> None:
+        # the store is opened in a worker thread,
+        # but used from the event loop afterwards
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+        # the primary key is the (username, ts) index, without
+        # rowid the rows are stored in the index itself
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS samples (
+                username TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                playtime INTEGER NOT NULL,
+                PRIMARY KEY (username, ts)
+            ) WITHOUT ROWID
+        """)
+        self.connection.commit()
+
+        # lowercased username -> the last recorded playtime
+        self.latest: dict[str, int] = dict(self.connection.execute("""
+            SELECT username, playtime FROM samples AS sample
+            WHERE ts = (SELECT MAX(ts) FROM samples WHERE username = sample.username)
+        """))
+
+        self.last_downsample = 0
+
+    def record(self, playtimes: dict[str, int], ts: int | None = None) -> int:
+        """Records a snapshot of playtimes, returns the amount of samples written."""
+
+        ts = int(time.time()) if ts is None else ts
+
+        rows = []
+        for username, playtime in playtimes.items():
+            username = username.lower()
+            if self.latest.get(username) != playtime:
+                self.latest[username] = playtime
+                rows.append((username, ts, playtime))
+
+        if rows:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO samples VALUES (?, ?, ?)", rows)
+
+        if ts - self.last_downsample >= DAY:
+            self.downsample(ts)
+
+        return len(rows)
+
+    def downsample(self, now: int) -> None:
+        """Keeps only the last sample of every day, or
+        every week for the oldest data, per player."""
+
+        with self.connection:
+            for cutoff, bucket in ((now - HOURLY_RETENTION, DAY),
+                                   (now - DAILY_RETENTION, WEEK)):
+                self.connection.execute("""
+                    DELETE FROM samples
+                    WHERE ts < :cutoff AND (username, ts) NOT IN (
+                        SELECT username, MAX(ts) FROM samples
+                        WHERE ts < :cutoff
+                        GROUP BY username, ts / :bucket
+                    )
+                """, {"cutoff": cutoff, "bucket": bucket})
+
+        self.last_downsample = now
+
+    def history(self, username: str, since: int) -> list[tuple[int, int]]:
+        """Returns the (ts, playtime) samples of a player from since on,
+        starting with the playtime the player had at since."""
+
+        username = username.lower()
+        samples = self.connection.execute(
+            "SELECT ts, playtime FROM samples "
+            "WHERE username = ? AND ts >= ? ORDER BY ts",
+            (username, since)
+        ).fetchall()
+
+        start = self.playtime_at(username, since)
+        if start is not None and (not samples or samples[0][0] > since):
+            samples.insert(0, (since, start))
+        return samples
+
+    def playtime_at(self, username: str, ts: int) -> int | None:
+        """Returns the playtime a player had at ts,
+        None when there is no sample before it."""
+
+        row = self.connection.execute(
+            "SELECT playtime FROM samples "
+            "WHERE username = ? AND ts <= ? ORDER BY ts DESC LIMIT 1",
+            (username.lower(), ts)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def last_samples_at(self, ts: int) -> dict[str, tuple[int, int]]:
+        """Returns the (ts, playtime) of the last sample every player had at ts."""
+
+        rows = self.connection.execute("""
+            SELECT username, MAX(ts), playtime FROM samples
+            WHERE ts <= ?
+            GROUP BY username
+        """, (ts,))
+        return {username: (sample_ts, playtime)
+                for username, sample_ts, playtime in rows}
+
+    def samples_since(self, ts: int):
+        """Yields the (username, ts, playtime)
+        samples recorded after ts, oldest first."""
+
+        yield from self.connection.execute(
+            "SELECT username, ts, playtime FROM samples WHERE ts > ? ORDER BY ts", (ts,)
+        )
+
+    def close(self) -> None:
+        self.connection.close()
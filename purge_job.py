@@ -0,0 +1,195 @@
+import asyncio
+import datetime
+import json
+import os
+import time
+
+import discord
+
+from message_cleaner import BULK_DELETE_LIMIT, delete_messages
+from settings import get_config, package_path
+
+PURGE_CONCURRENCY = get_config("PURGE_CONCURRENCY")
+PURGE_REQUESTS_PER_SECOND = get_config("PURGE_REQUESTS_PER_SECOND")
+PURGE_JOBS_PATH = package_path(get_config("PURGE_JOBS_PATH"))
+
+# channel history is fetched in pages of 100 messages, every page is a single request
+HISTORY_PAGE_SIZE = 100
+
+
+class RequestBudget:
+    """Spaces out the requests of all channel workers,
+    so together they stay under a set rate."""
+
+    def __init__(self, requests_per_second: float) -> None:
+        self.interval = 1 / requests_per_second
+        self.next_slot = 0.0
+
+    async def acquire(self) -> None:
+        """Waits until the next request is allowed."""
+
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class PurgeJob:
+    """Removes all messages of a user sent after a set time from
+    every text channel of a guild. The progress of every channel
+    is saved, so a cancelled or interrupted job can be resumed."""
+
+    def __init__(self, user_id: int, since: float) -> None:
+        self.user_id = user_id
+        self.since = since
+
+        # channel id -> id of the last scanned message
+        self.checkpoints: dict[int, int] = {}
+        self.finished_channels: set[int] = set()
+
+        self.scanned = 0
+        self.deleted = 0
+        self.cancelled = False
+
+    def to_dict(self) -> dict:
+        return {
+            "user_id": self.user_id,
+            "since": self.since,
+            "checkpoints": {str(channel_id): message_id
+                            for channel_id, message_id in self.checkpoints.items()},
+            "finished_channels": list(self.finished_channels),
+            "scanned": self.scanned,
+            "deleted": self.deleted
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PurgeJob":
+        job = cls(data["user_id"], data["since"])
+        job.checkpoints = {int(channel_id): message_id
+                           for channel_id, message_id in data["checkpoints"].items()}
+        job.finished_channels = set(data["finished_channels"])
+        job.scanned = data["scanned"]
+        job.deleted = data["deleted"]
+        return job
+
+    async def run(self, guild: discord.Guild) -> None:
+        """Purges all text channels the bot can read, a few of them at a time."""
+
+        budget = RequestBudget(PURGE_REQUESTS_PER_SECOND)
+        semaphore = asyncio.Semaphore(PURGE_CONCURRENCY)
+
+        async def purge_with_limit(channel: discord.TextChannel) -> None:
+            async with semaphore:
+                try:
+                    await self.purge_channel(channel, budget)
+                except discord.HTTPException as exception:
+                    # the channel stays unfinished and continues
+                    # from its checkpoint when the job is resumed
+                    print(f"PurgeJob - failed to purge #{channel.name}: {exception}")
+
+        channels = [channel for channel in guild.text_channels
+                    if channel.id not in self.finished_channels
+                    and channel.permissions_for(guild.me).read_message_history]
+
+        await asyncio.gather(*(purge_with_limit(channel) for channel in channels))
+
+    async def purge_channel(self,
+                            channel: discord.TextChannel,
+                            budget: RequestBudget) -> None:
+        """Streams the channel history from the checkpoint
+        onwards and removes the user's messages in chunks."""
+
+        if self.cancelled:
+            return
+
+        # continues after the last scanned message or
+        # starts at the beginning of the time window
+        checkpoint = self.checkpoints.get(channel.id)
+        if checkpoint is not None:
+            after = discord.Object(id=checkpoint)
+        else:
+            after = datetime.datetime.fromtimestamp(self.since,
+                                                    tz=datetime.timezone.utc)
+
+        user_messages = []
+        channel_scanned = 0
+        last_scanned_id = checkpoint
+        try:
+            await budget.acquire()
+            async for message in channel.history(limit=None, after=after,
+                                                 oldest_first=True):
+                self.scanned += 1
+                channel_scanned += 1
+
+                # the history iterator fetches a new page every 100 messages
+                if channel_scanned % HISTORY_PAGE_SIZE == 0:
+                    await budget.acquire()
+
+                if message.author.id == self.user_id:
+                    user_messages.append(message)
+
+                if len(user_messages) >= BULK_DELETE_LIMIT:
+                    await self.delete_chunk(channel, user_messages, budget)
+                    user_messages = []
+
+                # the checkpoint never skips messages that are waiting to be deleted
+                last_scanned_id = message.id
+                if not user_messages:
+                    self.checkpoints[channel.id] = last_scanned_id
+
+                if self.cancelled:
+                    break
+        except discord.Forbidden:
+            # the bot can see the channel, but can't read its history
+            pass
+
+        await self.delete_chunk(channel, user_messages, budget)
+        if last_scanned_id is not None:
+            self.checkpoints[channel.id] = last_scanned_id
+
+        if not self.cancelled:
+            self.finished_channels.add(channel.id)
+
+    async def delete_chunk(self,
+                           channel: discord.TextChannel,
+                           messages: list[discord.Message],
+                           budget: RequestBudget) -> None:
+        if not messages:
+            return
+
+        # every bulk or single delete waits for the shared budget
+        self.deleted += await delete_messages(channel, messages,
+                                              reason="Purge of a user's messages",
+                                              pacer=budget.acquire)
+
+
+class PurgeJobStore:
+    """Saves unfinished purge jobs to a json file,
+    so they can be resumed after a restart."""
+
+    def __init__(self) -> None:
+        self.jobs: dict[int, PurgeJob] = {}
+
+        if os.path.exists(PURGE_JOBS_PATH):
+            with open(PURGE_JOBS_PATH, "r") as read:
+                for data in json.load(read):
+                    job = PurgeJob.from_dict(data)
+                    self.jobs[job.user_id] = job
+
+    def save_file(self) -> None:
+        with open(PURGE_JOBS_PATH, "w") as write:
+            json.dump([job.to_dict() for job in self.jobs.values()], write, indent=4)
+
+    def get(self, user_id: int) -> PurgeJob | None:
+        return self.jobs.get(user_id)
+
+    def add(self, job: PurgeJob) -> None:
+        self.jobs[job.user_id] = job
+        self.save_file()
+
+    def remove(self, user_id: int) -> None:
+        if user_id in self.jobs:
+            del self.jobs[user_id]
+            self.save_file()
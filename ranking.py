@@ -0,0 +1,77 @@
+from array import array
+from operator import itemgetter
+
+from methods import format_playtime
+from settings import get_config
+
+# the last position of every top role tier, e.g.
+# [10, 25, ...] means positions 1-10 and 11-25
+TOP_ROLE_TIER_BOUNDARIES = [tier["max_position"]
+                            for tier in get_config("TOP_ROLE_TIERS")]
+
+# marks players without a top role tier
+NO_TIER = -1
+
+
+class Leaderboard:
+    """Players ranked by their playtime, kept as columns indexed by position - 1."""
+
+    def __init__(self, usernames: list[str], playtimes: array, tiers: array) -> None:
+        self.usernames = usernames
+        self.playtimes = playtimes
+        self.tiers = tiers
+
+    def __len__(self) -> int:
+        return len(self.usernames)
+
+    def tiered_players(self):
+        """Yields (username, tier) of every player that earned a top role tier."""
+
+        for username, tier in zip(self.usernames, self.tiers, strict=True):
+            if tier == NO_TIER:
+                # players are sorted, so the remaining ones have no tier either
+                break
+            yield username, tier
+
+
+def rank_players(top_times: dict[str, int],
+                 boundaries: list[int] = TOP_ROLE_TIER_BOUNDARIES) -> Leaderboard:
+    """Ranks the /top_times payload by playtime and assigns tiers to the positions."""
+
+    ranked = sorted(top_times.items(), key=itemgetter(1), reverse=True)
+    usernames = [username for username, _ in ranked]
+    playtimes = array("q", [playtime for _, playtime in ranked])
+
+    # positions are consecutive, so every tier is a single slice of the ranking
+    tiers = array("b", [NO_TIER]) * len(ranked)
+    start = 0
+    for tier, boundary in enumerate(boundaries):
+        end = min(boundary, len(ranked))
+        if end > start:
+            tiers[start:end] = array("b", [tier]) * (end - start)
+        start = max(start, end)
+
+    return Leaderboard(usernames, playtimes, tiers)
+
+
+def render_sections(leaderboard: Leaderboard, section_size: int = 25) -> list[str]:
+    """Formats the leaderboard into messages of section_size lines each."""
+
+    players = zip(leaderboard.usernames, leaderboard.playtimes, strict=True)
+    lines = [f"{position}: {username} - {format_playtime(playtime)}"
+             for position, (username, playtime) in enumerate(players, 1)]
+
+    return ["\n".join(lines[i:i + section_size])
+            for i in range(0, len(lines), section_size)]
+
+
+def render_gainers(days: int,
+                   gainers: list[tuple[str, int]],
+                   display_names: dict[str, str]) -> str:
+    """Formats the players that gained the most playtime in the last days."""
+
+    lines = [f"Most playtime gained in the last {days} days:"]
+    lines += [f"{position}: {display_names.get(username, username)} - "
+              f"{format_playtime(gained)}"
+              for position, (username, gained) in enumerate(gainers, 1)]
+    return "\n".join(lines)
@@ -0,0 +1,154 @@
+import time
+from array import array
+from collections import OrderedDict, deque
+
+# largest value a single bucket of the ring buffer can hold
+MAX_BUCKET_VALUE = 65535
+
+
+def current_tick(bucket_seconds: float) -> int:
+    """Returns the index of the current time bucket."""
+
+    return int(time.monotonic() / bucket_seconds)
+
+
+def fingerprint(content: str) -> int:
+    """Returns a fingerprint of a message that ignores
+    letter case and whitespace differences."""
+
+    return hash(" ".join(content.lower().split()))
+
+
+class SlidingWindowCounter:
+    """Counts events in a sliding time window
+    using a fixed ring buffer of time buckets."""
+
+    __slots__ = ("buckets", "last_tick", "total")
+
+    def __init__(self, size: int) -> None:
+        self.buckets = array("H", [0]) * size
+        self.last_tick = 0
+        self.total = 0
+
+    def advance(self, tick: int) -> None:
+        """Moves the window to the set tick and
+        forgets the buckets that fell out of it."""
+
+        size = len(self.buckets)
+        if tick - self.last_tick >= size:
+            # the whole window has expired
+            for i in range(size):
+                self.buckets[i] = 0
+            self.total = 0
+        else:
+            for expired_tick in range(self.last_tick + 1, tick + 1):
+                index = expired_tick % size
+                self.total -= self.buckets[index]
+                self.buckets[index] = 0
+
+        self.last_tick = max(self.last_tick, tick)
+
+    def add(self, tick: int) -> int:
+        """Records an event at the set tick and
+        returns the amount of events in the window."""
+
+        self.advance(tick)
+
+        index = tick % len(self.buckets)
+        if self.buckets[index] < MAX_BUCKET_VALUE:
+            self.buckets[index] += 1
+            self.total += 1
+
+        return self.total
+
+
+class RateTracker:
+    """Keeps a sliding window counter for every key, the amount of tracked
+    keys is bounded and keys without recent events are evicted."""
+
+    def __init__(self, window_size: int, max_keys: int) -> None:
+        self.window_size = window_size
+        self.max_keys = max_keys
+
+        # ordered from the least to the most recently active key
+        self.counters: OrderedDict[int, SlidingWindowCounter] = OrderedDict()
+
+    def hit(self, key: int, tick: int) -> int:
+        """Records an event for the key and returns
+        its amount of events in the window."""
+
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = self.counters[key] = SlidingWindowCounter(self.window_size)
+
+            # forgetting the least recently active key when the limit is reached
+            if len(self.counters) > self.max_keys:
+                self.counters.popitem(last=False)
+        else:
+            self.counters.move_to_end(key)
+
+        return counter.add(tick)
+
+    def evict_stale(self, tick: int) -> int:
+        """Removes keys whose whole window has expired
+        and returns the amount of removed keys."""
+
+        evicted = 0
+        while self.counters:
+            key, counter = next(iter(self.counters.items()))
+            if tick - counter.last_tick < self.window_size:
+                # the rest of the keys has been active more recently
+                break
+
+            del self.counters[key]
+            evicted += 1
+
+        return evicted
+
+
+class DuplicateTracker:
+    """Remembers the fingerprints of the recent messages
+    of every user to detect repeated content."""
+
+    def __init__(self, window_size: int, history_size: int, max_keys: int) -> None:
+        self.window_size = window_size
+        self.history_size = history_size
+        self.max_keys = max_keys
+
+        # user id -> (tick, fingerprint) of the user's recent messages
+        self.histories: OrderedDict[int, deque] = OrderedDict()
+
+    def hit(self, key: int, content: str, tick: int) -> int:
+        """Records a message of the key and returns how many times the same content
+        was sent in the window, the message included."""
+
+        history = self.histories.get(key)
+        if history is None:
+            history = self.histories[key] = deque(maxlen=self.history_size)
+
+            if len(self.histories) > self.max_keys:
+                self.histories.popitem(last=False)
+        else:
+            self.histories.move_to_end(key)
+
+        message_fingerprint = fingerprint(content)
+        history.append((tick, message_fingerprint))
+
+        return sum(1 for sent_tick, sent_fingerprint in history
+                   if sent_fingerprint == message_fingerprint
+                   and tick - sent_tick < self.window_size)
+
+    def evict_stale(self, tick: int) -> int:
+        """Removes users without messages in the window
+        and returns the amount of removed users."""
+
+        evicted = 0
+        while self.histories:
+            key, history = next(iter(self.histories.items()))
+            if history and tick - history[-1][0] < self.window_size:
+                break
+
+            del self.histories[key]
+            evicted += 1
+
+        return evicted
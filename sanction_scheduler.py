@@ -0,0 +1,154 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import json
+import os
+import time
+from typing import Awaitable, Callable
+
+from settings import get_config, package_path
+
+SCHEDULED_SANCTIONS_PATH = package_path(get_config("SCHEDULED_SANCTIONS_PATH"))
+
+# a failed handler is retried after this delay in
+# seconds, doubled after every failure up to the maximum
+RETRY_DELAY = 60
+MAX_RETRY_DELAY = 3600
+
+# called with the payload of an expired sanction
+ExpiryHandler = Callable[[dict], Awaitable[None]]
+
+
+class SanctionScheduler:
+    """Fires actions (unbans, unmutes, ...) when the sanctions that
+    scheduled them expire. Pending sanctions are kept in a heap ordered
+    by expiry and saved to a json file, so they survive restarts."""
+
+    def __init__(self) -> None:
+        # [expires_at, sequence, key, action, payload], the
+        # sequence keeps the order of equal expiries stable
+        self.heap: list[list] = []
+        self.sequence = itertools.count()
+
+        self.handlers: dict[str, ExpiryHandler] = {}
+
+        # key -> failed attempts of a sanction being retried
+        self.failures: dict[str, int] = {}
+        self.wake_up = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+        # held while a handler runs, so stopping does not interrupt an unban halfway
+        self.firing_lock = asyncio.Lock()
+
+        self.load_file()
+
+    def load_file(self) -> None:
+        if not os.path.exists(SCHEDULED_SANCTIONS_PATH):
+            return
+
+        with open(SCHEDULED_SANCTIONS_PATH, "r") as read:
+            for expires_at, key, action, payload in json.load(read):
+                self.heap.append([expires_at, next(self.sequence), key, action,
+                                  payload])
+
+        heapq.heapify(self.heap)
+
+    def save_file(self) -> None:
+        with open(SCHEDULED_SANCTIONS_PATH, "w") as write:
+            json.dump([[expires_at, key, action, payload]
+                       for expires_at, _, key, action, payload in self.heap],
+                      write, indent=4)
+
+    def register(self, action: str, handler: ExpiryHandler) -> None:
+        """Sets the coroutine that is called when
+        a sanction with the set action expires."""
+
+        self.handlers[action] = handler
+
+    def schedule(self, key: str, action: str, payload: dict, expires_at: float) -> None:
+        """Schedules an action, a pending sanction with the same key is replaced."""
+
+        self.remove(key, save=False)
+        heapq.heappush(self.heap,
+                       [expires_at, next(self.sequence), key, action, payload])
+        self.save_file()
+
+        # the new sanction might expire sooner than the one the runner is waiting for
+        self.wake_up.set()
+
+    def cancel(self, key: str) -> bool:
+        """Cancels a pending sanction, returns whether there was one."""
+
+        return self.remove(key)
+
+    def remove(self, key: str, save: bool = True) -> bool:
+        self.failures.pop(key, None)
+        remaining = [entry for entry in self.heap if entry[2] != key]
+        if len(remaining) == len(self.heap):
+            return False
+
+        heapq.heapify(remaining)
+        self.heap = remaining
+        if save:
+            self.save_file()
+        return True
+
+    def start(self, bot) -> None:
+        """Starts firing expired sanctions, should be
+        called once all handlers are registered."""
+
+        self.task = asyncio.create_task(self.run(bot))
+
+    async def stop(self) -> None:
+        """Stops firing sanctions once the running
+        handler has finished, pending ones stay saved."""
+
+        async with self.firing_lock:
+            if self.task is not None:
+                self.task.cancel()
+
+    async def run(self, bot) -> None:
+        """Sleeps until the nearest expiry, fires it and repeats."""
+
+        # sanctions that expired while the bot was offline need the guild cache
+        await bot.wait_until_ready()
+
+        while True:
+            self.wake_up.clear()
+
+            if not self.heap:
+                await self.wake_up.wait()
+                continue
+
+            delay = self.heap[0][0] - time.time()
+            if delay > 0:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.wake_up.wait(), timeout=delay)
+                continue
+
+            # the sanction is only removed from the file once it has been handled
+            async with self.firing_lock:
+                _, _, key, action, payload = heapq.heappop(self.heap)
+
+                handler = self.handlers.get(action)
+                if handler is None:
+                    print(f"Scheduler - no handler for '{action}', dropping '{key}'.")
+                else:
+                    try:
+                        await handler(payload)
+                    except Exception as exception:
+                        # a failed unban must not turn a timed ban into
+                        # a permanent one, the sanction is retried
+                        failures = self.failures.get(key, 0) + 1
+                        self.failures[key] = failures
+                        delay = min(RETRY_DELAY * 2 ** (failures - 1), MAX_RETRY_DELAY)
+                        print(f"Scheduler - '{key}' failed, "
+                              f"retrying in {delay} s: {exception}")
+                        retry_at = time.time() + delay
+                        heapq.heappush(self.heap, [retry_at, next(self.sequence),
+                                                   key, action, payload])
+                    else:
+                        self.failures.pop(key, None)
+
+                self.save_file()
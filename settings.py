@@ -1,8 +1,28 @@
 import json
 import os
+from functools import lru_cache
 
 ON_REPLIT = False
 
+# the config and secrets are found next to this
+# file, independent of the working directory
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def package_path(path: str) -> str:
+    """Resolves a path of a data file against the
+    package directory, absolute paths are kept."""
+
+    return os.path.join(PACKAGE_DIR, path)
+
+
+@lru_cache(maxsize=None)
+def load_json(file_name: str) -> dict:
+    """Reads a json file of the package once, later calls return the parsed content."""
+
+    with open(package_path(file_name), "r") as read:
+        return json.load(read)
+
 
 def get_secret(key: str):
     """Returns an environmental variable based on the current platform."""
@@ -10,8 +30,7 @@ def get_secret(key: str):
     if not ON_REPLIT:
         # local way of retrieving env variables
 
-        with open("secrets.json", "r") as r:
-            _SECRETS = json.load(r)
+        _SECRETS = load_json("secrets.json")
 
         if key not in _SECRETS:
             raise Exception(f"Unknown key: '{key}'.")
@@ -33,8 +52,7 @@ def get_secret(key: str):
 def get_config(key: str):
     """Loads a config value from a json file, they don't have to be private."""
 
-    with open("config.json", "r") as read:
-        config = json.load(read)
+    config = load_json("config.json")
 
     if key not in config:
         raise Exception(f"Unknown configuration with the name '{key}'")
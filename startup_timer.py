@@ -0,0 +1,31 @@
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Measures how long each phase of the startup takes."""
+
+    def __init__(self) -> None:
+        self.started_at = time.perf_counter()
+
+        # phase name -> duration in seconds, in the order the phases ran
+        self.phases: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def report(self) -> str:
+        """Formats the duration of every phase and of the whole startup."""
+
+        lines = [f"{name}: {duration * 1000:.0f} ms"
+                 for name, duration in self.phases.items()]
+        lines.append(f"total: {self.elapsed() * 1000:.0f} ms")
+        return "\n".join(lines)
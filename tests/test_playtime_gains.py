@@ -0,0 +1,56 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playtime_gains import GainTracker, spread_gain  # noqa: E402
+from playtime_history import DAY, PlaytimeHistory  # noqa: E402
+
+NOW = 1000 * DAY
+
+
+class SpreadGainTest(unittest.TestCase):
+
+    def test_shares_add_up(self):
+        shares = spread_gain(1000, 0, 7 * DAY, 0)
+        self.assertEqual([day for day, _ in shares], list(range(7)))
+        self.assertEqual(sum(gained for _, gained in shares), 1000)
+
+    def test_clipped_to_since(self):
+        shares = spread_gain(100, 0, 10 * DAY, 8 * DAY)
+        self.assertEqual(shares, [(8, 10), (9, 10)])
+
+
+class GainTrackerTest(unittest.TestCase):
+
+    def test_seed_matches_live_updates(self):
+        """A player last seen long before the window only
+        gets the part of the gain that falls into it."""
+
+        samples = [({"player": 10}, NOW - 365 * DAY), ({"player": 10000}, NOW - DAY)]
+
+        live = GainTracker([7, 30])
+        history = PlaytimeHistory(":memory:")
+        for playtimes, ts in samples:
+            live.update(playtimes, ts)
+            history.record(playtimes, ts)
+        live.expire(NOW // DAY)
+
+        seeded = GainTracker([7, 30])
+        seeded.seed(history, NOW)
+
+        for days in (7, 30):
+            self.assertEqual(seeded.top(days, 1), live.top(days, 1))
+        self.assertLess(seeded.top(7, 1)[0][1], 200)
+        history.close()
+
+    def test_excluded_players(self):
+        tracker = GainTracker([7], excluded=["Secret"])
+        tracker.update({"secret": 0, "player": 0}, NOW - DAY)
+        tracker.update({"secret": 500, "player": 100}, NOW)
+        self.assertEqual(tracker.top(7, 5), [("player", 100)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import bisect
+
+from discord.app_commands import Choice
+
+# discord shows at most 25 autocomplete choices
+MAX_AUTOCOMPLETE_CHOICES = 25
+
+
+class UsernameIndex:
+    """Sorted index of known Roblox usernames
+    answering prefix lookups with a binary search."""
+
+    def __init__(self, usernames=()) -> None:
+        # lowercased username -> username as it was last seen
+        self.names: dict[str, str] = {}
+
+        # sorted lowercased usernames
+        self.sorted_names: list[str] = []
+
+        self.add_many(usernames)
+
+    def __len__(self) -> int:
+        return len(self.sorted_names)
+
+    def add(self, username: str, replace: bool = True) -> None:
+        """Adds a single username, keeping the index sorted.
+        Without replace, the spelling of an already known username is kept."""
+
+        key = username.lower()
+        if key not in self.names:
+            bisect.insort(self.sorted_names, key)
+        elif not replace:
+            return
+        self.names[key] = username
+
+    def add_many(self, usernames, replace: bool = True) -> None:
+        """Adds a batch of usernames, sorting once
+        instead of inserting them one by one."""
+
+        new_keys = []
+        for username in usernames:
+            key = username.lower()
+            if key not in self.names:
+                new_keys.append(key)
+            elif not replace:
+                continue
+            self.names[key] = username
+
+        if len(new_keys) == 1:
+            bisect.insort(self.sorted_names, new_keys[0])
+        elif new_keys:
+            self.sorted_names.extend(new_keys)
+            self.sorted_names.sort()
+
+    def complete(self,
+                 prefix: str,
+                 limit: int = MAX_AUTOCOMPLETE_CHOICES,
+                 exclude=()) -> list[str]:
+        """Returns up to limit usernames starting with the prefix,
+        in alphabetical order. Excluded lowercased usernames are
+        skipped without counting towards the limit."""
+
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.sorted_names, prefix)
+
+        # every key starting with the prefix sorts before
+        # the prefix followed by the highest character
+        stop = min(start + limit + len(exclude), len(self.sorted_names))
+        end = bisect.bisect_left(self.sorted_names, prefix + "\U0010ffff", start, stop)
+        names = [self.names[key]
+                 for key in self.sorted_names[start:end] if key not in exclude]
+        return names[:limit]
+
+    def choices(self, current: str, exclude=()) -> list[Choice[str]]:
+        """Returns autocomplete choices for the current input."""
+
+        return [Choice(name=username, value=username)
+                for username in self.complete(current, exclude=exclude)]
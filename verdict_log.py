@@ -0,0 +1,120 @@
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from logging.handlers import RotatingFileHandler
+
+from settings import get_config
+
+# record types, every record is a single tab separated line
+VERDICT_RECORD = "V"
+SCANNED_RECORD = "S"
+
+# how many scanned messages are counted before the count is written to the log
+SCANNED_CHECKPOINT_INTERVAL = 1000
+
+# ids of the last messages with a logged verdict, an edited message is not logged again
+LOGGED_MESSAGES_REMEMBERED = 10000
+
+
+class VerdictLog:
+    """Appends moderation verdicts to a size limited, rotating log file."""
+
+    def __init__(self, path: str, max_bytes: int, backup_count: int) -> None:
+        self.path = path
+        self.scanned_since_checkpoint = 0
+        self.logged_messages: OrderedDict[int, None] = OrderedDict()
+
+        handler = RotatingFileHandler(path, maxBytes=max_bytes,
+                                      backupCount=backup_count, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+
+        # a dedicated logger that does not end up in the console output
+        self.logger = logging.getLogger(f"verdicts.{path}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.handlers = [handler]
+
+    def write(self, *fields) -> None:
+        self.logger.info("\t".join(str(field) for field in fields))
+
+    def log_verdict(self,
+                    message_id: int,
+                    channel_id: int,
+                    term: str,
+                    span: tuple[int, int]) -> bool:
+        """Records that a message would have been moderated,
+        returns False if the message was already logged."""
+
+        if message_id in self.logged_messages:
+            return False
+
+        self.logged_messages[message_id] = None
+        if len(self.logged_messages) > LOGGED_MESSAGES_REMEMBERED:
+            self.logged_messages.popitem(last=False)
+
+        self.write(VERDICT_RECORD, int(time.time()), message_id, channel_id,
+                   term.replace("\t", " "), *span)
+        return True
+
+    def count_scanned(self) -> None:
+        """Counts an evaluated message, the count is needed to compute hit rates."""
+
+        self.scanned_since_checkpoint += 1
+        if self.scanned_since_checkpoint >= SCANNED_CHECKPOINT_INTERVAL:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the amount of messages scanned since the last checkpoint."""
+
+        if self.scanned_since_checkpoint:
+            self.write(SCANNED_RECORD, int(time.time()), self.scanned_since_checkpoint)
+            self.scanned_since_checkpoint = 0
+
+
+def summarize(path: str) -> dict:
+    """Reads the log and its rotated backups and counts the hits of every term."""
+
+    # backups have a higher number the older they are
+    paths = [path]
+    backup_number = 1
+    while os.path.exists(f"{path}.{backup_number}"):
+        paths.append(f"{path}.{backup_number}")
+        backup_number += 1
+
+    scanned = 0
+    term_hits: dict[str, int] = {}
+    for log_path in paths:
+        if not os.path.exists(log_path):
+            continue
+
+        with open(log_path, "r", encoding="utf-8") as read:
+            for line in read:
+                fields = line.rstrip("\n").split("\t")
+                if fields[0] == VERDICT_RECORD and len(fields) == 7:
+                    term_hits[fields[4]] = term_hits.get(fields[4], 0) + 1
+                elif fields[0] == SCANNED_RECORD and len(fields) == 3:
+                    scanned += int(fields[2])
+
+    return {
+        "scanned": scanned,
+        "verdicts": sum(term_hits.values()),
+        "terms": dict(sorted(term_hits.items(), key=lambda item: item[1], reverse=True))
+    }
+
+
+def format_summary(summary: dict, limit: int | None = None) -> str:
+    """Formats a summary into a table of terms with their hits and hit rates."""
+
+    scanned = summary["scanned"]
+    lines = [f"Scanned {scanned} message(s), {summary['verdicts']} verdict(s)."]
+    for term, hits in list(summary["terms"].items())[:limit]:
+        hit_rate = f"{hits / scanned:.3%}" if scanned else "-"
+        lines.append(f"{term}: {hits} ({hit_rate})")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    log_path = sys.argv[1] if len(sys.argv) > 1 else get_config("VERDICT_LOG_PATH")
+    print(format_summary(summarize(log_path)))